@@ -6,12 +6,24 @@ Standalone version with all functions embedded
 import streamlit as st
 import pandas as pd
 import numpy as np
-import tempfile
-import plotly.express as px
+import io
 import os
+import logging
+import hashlib
+import time
+from pathlib import Path
+import plotly.express as px
 
 st.set_page_config(page_title="KPI Analysis", page_icon="📊", layout="wide")
 
+logger = logging.getLogger(__name__)
+
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"  # Rust-backed reader, much faster than openpyxl
+except ImportError:
+    EXCEL_ENGINE = None  # pandas default (openpyxl)
+
 # ===== EMBEDDED CONFIGURATION =====
 CONFIG = {
     "energy_sheet": 0,
@@ -20,6 +32,15 @@ CONFIG = {
     "gas_to_kwh": 11.5,
 }
 
+# Parsed uploads persist here across sessions and restarts - delete to reset
+CACHE_DIR = Path(os.getenv("DRYER_CACHE_DIR", ".cache"))
+# Own subdirectory - core/io_cache keeps its snapshots in CACHE_DIR itself
+UPLOAD_CACHE_DIR = CACHE_DIR / "uploads"
+# Part of every snapshot key - bump whenever parse_energy_simple/parse_wagon_simple output changes
+CACHE_VERSION = 1
+# Snapshots not used for this many days are removed when a new one is written
+CACHE_MAX_AGE_DAYS = float(os.getenv("DRYER_CACHE_MAX_AGE_DAYS", "30"))
+
 ZONE_MAPPING = {
     "Z2": "Zone 2",
     "Z3": "Zone 3",
@@ -77,14 +98,18 @@ def parse_wagon_simple(df):
     else:
         df["Month"] = 1
     
-    return df
-
-def simple_kpi_analysis(energy_df, wagon_df, products_filter=None, month_filter=None):
-    """Simple KPI calculation"""
+    # Few distinct products - filters and groupbys then work on integer codes
+    if "Produkt" in df.columns:
+        df["Produkt"] = df["Produkt"].astype("category")
+    if "WG_Nr" in df.columns:
+        df["WG_Nr"] = df["WG_Nr"].astype("string")
     
-    # Parse data
-    energy = parse_energy_simple(energy_df)
-    wagons = parse_wagon_simple(wagon_df)
+    # Keep only what the KPI calculation uses - raw columns that mix times
+    # and text would also keep the frame out of the Parquet cache
+    return df[[c for c in ("WG_Nr", "Produkt", "m3", "Month") if c in df.columns]]
+
+def simple_kpi_analysis(energy, wagons, products_filter=None, month_filter=None):
+    """Simple KPI calculation on parsed energy and wagon data"""
     
     # Apply filters
     if products_filter and "Produkt" in wagons.columns:
@@ -96,40 +121,142 @@ def simple_kpi_analysis(energy_df, wagon_df, products_filter=None, month_filter=
     if month_filter and "Month" in energy.columns:
         energy = energy[energy["Month"] == month_filter]
     
-    # Calculate KPIs by product and zone
-    results = []
-    
     if "Produkt" not in wagons.columns:
         return None
     
-    for product in wagons["Produkt"].dropna().unique():
-        product_wagons = wagons[wagons["Produkt"] == product]
-        total_volume = product_wagons["m3"].sum()
-        wagon_count = len(product_wagons)
-        
-        for zone_key, zone_name in ZONE_MAPPING.items():
-            energy_col = f"E_{zone_name}_kWh"
-            
-            if energy_col in energy.columns:
-                total_energy = energy[energy_col].sum()
-                
-                # Simple allocation: proportional to volume
-                total_wagon_volume = wagons["m3"].sum()
-                if total_wagon_volume > 0:
-                    product_energy = total_energy * (total_volume / total_wagon_volume)
-                else:
-                    product_energy = 0
-                
-                results.append({
-                    'Produkt': product,
-                    'Zone': zone_key,
-                    'Energy_kWh': product_energy,
-                    'Volume_m3': total_volume,
-                    'Wagons': wagon_count,
-                    'kWh_per_m3': product_energy / total_volume if total_volume > 0 else 0
-                })
-    
-    return pd.DataFrame(results)
+    # Volume and wagon count per product in one pass instead of a mask per product
+    product_stats = wagons.groupby("Produkt", sort=False, observed=True)["m3"].agg(["sum", "size"])
+    
+    # Totals are the same for every product - compute them once
+    total_wagon_volume = wagons["m3"].sum()
+    zone_energy = {
+        zone_key: energy[f"E_{zone_name}_kWh"].sum()
+        for zone_key, zone_name in ZONE_MAPPING.items()
+        if f"E_{zone_name}_kWh" in energy.columns
+    }
+    
+    # One row per product and zone, product-major like the nested loop it replaces
+    n_zones = len(zone_energy)
+    volume = np.repeat(product_stats["sum"].to_numpy(dtype=float), n_zones)
+    zone_total = np.tile(np.fromiter(zone_energy.values(), dtype=float, count=n_zones), len(product_stats))
+    
+    # Simple allocation: proportional to volume, zero where there is no volume
+    if total_wagon_volume > 0:
+        product_energy = zone_total * (volume / total_wagon_volume)
+    else:
+        product_energy = np.zeros_like(volume)
+    
+    return pd.DataFrame({
+        'Produkt': np.repeat(product_stats.index.to_numpy(), n_zones),
+        'Zone': np.tile(list(zone_energy), len(product_stats)),
+        'Energy_kWh': product_energy,
+        'Volume_m3': volume,
+        'Wagons': np.repeat(product_stats["size"].to_numpy(), n_zones),
+        'kWh_per_m3': np.divide(product_energy, volume, out=np.zeros_like(volume), where=volume > 0)
+    })
+
+def upload_digest(data):
+    """Content hash of an uploaded file - the key for both caches below"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def load_parquet_cached(digest, kind, load, *settings):
+    """Return the parsed upload from the on-disk Parquet cache, parsing it on a miss"""
+    key = hashlib.blake2b(f"{CACHE_VERSION}:{digest}:{settings!r}".encode(), digest_size=16)
+    cache_file = UPLOAD_CACHE_DIR / f"{key.hexdigest()}-{kind}.parquet"
+    
+    try:
+        # Touch on use so snapshots of files still being analyzed are not pruned
+        os.utime(cache_file)
+        return pd.read_parquet(cache_file)
+    except FileNotFoundError:
+        pass
+    
+    df = load()
+    
+    # Write to a private file first so other sessions never see a partial one
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        UPLOAD_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(tmp_file, compression="zstd")
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        # Best effort - the parsed frame is still returned
+        logger.warning(f"Could not cache {kind} data: {str(e)}")
+        tmp_file.unlink(missing_ok=True)
+    else:
+        prune_parquet_cache()
+    
+    return df
+
+def prune_parquet_cache():
+    """Delete upload snapshots that have not been used for CACHE_MAX_AGE_DAYS"""
+    cutoff = time.time() - CACHE_MAX_AGE_DAYS * 86400
+    for cache_file in UPLOAD_CACHE_DIR.glob("*.parquet"):
+        try:
+            if cache_file.stat().st_mtime < cutoff:
+                cache_file.unlink()
+        except FileNotFoundError:
+            pass  # removed by another session in the meantime
+
+def read_excel(data, **kwargs):
+    """Read uploaded workbook bytes, retrying with openpyxl if calamine rejects the file"""
+    if EXCEL_ENGINE == "calamine":
+        try:
+            return pd.read_excel(io.BytesIO(data), engine="calamine", **kwargs)
+        except Exception as e:
+            # e.g. styles or xlsm features calamine does not support
+            logger.warning(f"calamine could not read the upload, falling back to openpyxl: {str(e)}")
+    return pd.read_excel(io.BytesIO(data), engine="openpyxl", **kwargs)
+
+# The leading underscore keeps Streamlit from hashing the bytes again - the
+# digest already identifies the content
+@st.cache_data(show_spinner=False)
+def load_energy(digest, _data):
+    """Read and parse uploaded energy workbook - cached on file content"""
+    def load():
+        df = read_excel(_data, sheet_name=CONFIG["energy_sheet"])
+        return parse_energy_simple(df)
+    
+    return load_parquet_cached(digest, "energy", load, CONFIG["energy_sheet"], CONFIG["gas_to_kwh"])
+
+@st.cache_data(show_spinner=False)
+def load_wagon(digest, _data):
+    """Read and parse uploaded wagon workbook - cached on file content"""
+    def load():
+        df = read_excel(_data, sheet_name=CONFIG["wagon_sheet"], header=CONFIG["wagon_header_row"])
+        return parse_wagon_simple(df)
+    
+    return load_parquet_cached(digest, "wagon", load, CONFIG["wagon_sheet"], CONFIG["wagon_header_row"])
+
+def build_excel_report(results_df):
+    """Serialize the KPI results to xlsx bytes - built in memory, no temp file"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        results_df.to_excel(writer, sheet_name='KPI_Results', index=False)
+    return output.getvalue()
+
+@st.cache_data(show_spinner=False)
+def build_charts(results_df):
+    """Build the efficiency bar and energy pie charts - cached on the results"""
+    fig1 = px.bar(
+        results_df,
+        x="Zone",
+        y="kWh_per_m3",
+        color="Produkt",
+        title="Energy Efficiency by Zone & Product",
+        barmode="group"
+    )
+    fig1.update_layout(height=400)
+    
+    fig2 = px.pie(
+        results_df,
+        values="Energy_kWh",
+        names="Produkt",
+        title="Energy Distribution by Product"
+    )
+    fig2.update_layout(height=400)
+    
+    return fig1, fig2
 
 # ===== UI =====
 
@@ -171,36 +298,14 @@ if analyze_btn:
     if not energy_file or not wagon_file:
         st.error("⚠️ Please upload both files")
     else:
-        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp_e, \
-             tempfile.NamedTemporaryFile(suffix=".xlsm", delete=False) as tmp_w:
-            
-            # Save uploads to temp files
-            tmp_e.write(energy_file.read())
-            tmp_w.write(wagon_file.read())
-            tmp_e.flush()
-            tmp_w.flush()
-            
-            try:
-                # Progress
-                progress = st.progress(0)
-                status = st.empty()
-                
-                # Load files
-                status.text("📊 Loading energy data...")
-                progress.progress(25)
-                energy_df = pd.read_excel(tmp_e.name, sheet_name=CONFIG["energy_sheet"])
-                
-                status.text("🚛 Loading wagon data...")
-                progress.progress(50)
-                wagon_df = pd.read_excel(
-                    tmp_w.name,
-                    sheet_name=CONFIG["wagon_sheet"],
-                    header=CONFIG["wagon_header_row"]
-                )
-                
-                # Analyze
-                status.text("🔄 Calculating KPIs...")
-                progress.progress(75)
+        try:
+            # One spinner instead of per-step progress updates - each update is a
+            # front-end round-trip, and cached reruns finish in well under a second
+            with st.spinner("🔄 Loading data and calculating KPIs..."):
+                energy_bytes = energy_file.getvalue()
+                wagon_bytes = wagon_file.getvalue()
+                energy_df = load_energy(upload_digest(energy_bytes), energy_bytes)
+                wagon_df = load_wagon(upload_digest(wagon_bytes), wagon_bytes)
                 
                 results_df = simple_kpi_analysis(
                     energy_df,
@@ -208,103 +313,73 @@ if analyze_btn:
                     selected_products if selected_products else None,
                     month if month != 0 else None
                 )
+            
+            if results_df is None or results_df.empty:
+                st.warning("⚠️ No data found. Please check your filters and files.")
+            else:
+                st.success("✅ Analysis complete!")
+                
+                # Summary KPIs
+                st.markdown("### 📈 Key Performance Indicators")
                 
-                progress.progress(100)
-                status.empty()
-                progress.empty()
+                col1, col2, col3 = st.columns(3)
                 
-                if results_df is None or results_df.empty:
-                    st.warning("⚠️ No data found. Please check your filters and files.")
-                else:
-                    st.success("✅ Analysis complete!")
-                    
-                    # Summary KPIs
-                    st.markdown("### 📈 Key Performance Indicators")
-                    
-                    col1, col2, col3 = st.columns(3)
-                    
-                    total_energy = results_df['Energy_kWh'].sum()
-                    total_volume = results_df['Volume_m3'].sum()
-                    avg_kpi = results_df['kWh_per_m3'].mean()
-                    
-                    col1.metric("Total Energy", f"{total_energy:,.0f} kWh")
-                    col2.metric("Total Volume", f"{total_volume:,.0f} m³")
-                    col3.metric("Avg Efficiency", f"{avg_kpi:.2f} kWh/m³")
-                    
-                    # Charts
-                    st.markdown("### 📊 Analysis Charts")
-                    
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        # Group by zone and product
-                        fig1 = px.bar(
-                            results_df,
-                            x="Zone",
-                            y="kWh_per_m3",
-                            color="Produkt",
-                            title="Energy Efficiency by Zone & Product",
-                            barmode="group"
-                        )
-                        fig1.update_layout(height=400)
-                        st.plotly_chart(fig1, use_container_width=True)
-                    
-                    with col2:
-                        # Pie chart
-                        fig2 = px.pie(
-                            results_df,
-                            values="Energy_kWh",
-                            names="Produkt",
-                            title="Energy Distribution by Product"
-                        )
-                        fig2.update_layout(height=400)
-                        st.plotly_chart(fig2, use_container_width=True)
-                    
-                    # Data table
-                    with st.expander("📋 View Detailed Data"):
-                        st.dataframe(
-                            results_df.style.format({
-                                'Energy_kWh': '{:,.2f}',
-                                'Volume_m3': '{:,.2f}',
-                                'kWh_per_m3': '{:,.2f}',
-                                'Wagons': '{:,.0f}'
-                            }),
-                            use_container_width=True
-                        )
-                    
-                    # Export
-                    st.markdown("### 📥 Export Results")
-                    
-                    # Excel export
-                    output_file = "kpi_results.xlsx"
-                    with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
-                        results_df.to_excel(writer, sheet_name='KPI_Results', index=False)
-                    
-                    with open(output_file, 'rb') as f:
-                        st.download_button(
-                            "📥 Download Excel Report",
-                            f.read(),
-                            output_file,
-                            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True
-                        )
-                    
-                    # Cleanup
-                    os.unlink(output_file)
+                total_energy = results_df['Energy_kWh'].sum()
+                total_volume = results_df['Volume_m3'].sum()
+                avg_kpi = results_df['kWh_per_m3'].mean()
                 
-            except Exception as e:
-                st.error(f"❌ Error during analysis: {str(e)}")
+                col1.metric("Total Energy", f"{total_energy:,.0f} kWh")
+                col2.metric("Total Volume", f"{total_volume:,.0f} m³")
+                col3.metric("Avg Efficiency", f"{avg_kpi:.2f} kWh/m³")
                 
-                with st.expander("🔍 Error Details"):
-                    st.exception(e)
+                # Charts
+                st.markdown("### 📊 Analysis Charts")
+                
+                col1, col2 = st.columns(2)
+                fig1, fig2 = build_charts(results_df)
+                
+                with col1:
+                    st.plotly_chart(fig1, use_container_width=True)
+                
+                with col2:
+                    st.plotly_chart(fig2, use_container_width=True)
+                
+                # Data table
+                with st.expander("📋 View Detailed Data"):
+                    # Rounded plain frame - no Styler HTML rendering
+                    st.dataframe(
+                        results_df.round({'Energy_kWh': 2, 'Volume_m3': 2, 'kWh_per_m3': 2}),
+                        use_container_width=True
+                    )
+                
+                # Export
+                st.markdown("### 📥 Export Results")
+                
+                col1, col2 = st.columns(2)
+                
+                # Excel export - a few dozen rows, built in memory
+                col1.download_button(
+                    "📥 Download Excel Report",
+                    build_excel_report(results_df),
+                    "kpi_results.xlsx",
+                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    use_container_width=True
+                )
+                
+                # CSV export - no workbook serialization, opens anywhere
+                col2.download_button(
+                    "📥 Download CSV",
+                    results_df.to_csv(index=False).encode("utf-8"),
+                    "kpi_results.csv",
+                    "text/csv",
+                    use_container_width=True
+                )
+            
+        except Exception as e:
+            st.error(f"❌ Error during analysis: {str(e)}")
             
-            finally:
-                # Cleanup temp files
-                try:
-                    os.unlink(tmp_e.name)
-                    os.unlink(tmp_w.name)
-                except:
-                    pass
+            with st.expander("🔍 Error Details"):
+                st.exception(e)
 
 else:
     # Instructions
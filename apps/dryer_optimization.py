@@ -1,6 +1,6 @@
 """
 Lindner Dryer - Production Order Optimizer
-Standalone version with embedded optimizer
+Embedded optimizer class; only the sequencing kernels come from core.sequencing
 """
 
 import streamlit as st
@@ -9,9 +9,18 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 import json
+import io
 import os
+import sys
 import numpy as np
-from itertools import permutations
+from pathlib import Path
+
+# Streamlit runs this file as a script - make the repository root importable
+ROOT = str(Path(__file__).resolve().parents[1])
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from core.sequencing import held_karp, two_opt
 
 # ------------------ Page Configuration ------------------
 st.set_page_config(
@@ -60,6 +69,18 @@ class ProductionOptimizer:
         self.profiles = database['product_profiles']
         self.transitions = database['transition_matrix']
         self.rules = database.get('optimization_rules', {})
+        
+        # Dense copy of the transition matrix so searches score sequences with NumPy
+        self.index = {p: i for i, p in enumerate(self.transitions)}
+        self.costs = np.array([
+            [self.transitions[a][b] for b in self.transitions]
+            for a in self.transitions
+        ], dtype=np.float64)
+    
+    def _cost_matrix(self, products):
+        """Transition cost matrix restricted to the given products, in their order"""
+        idx = np.array([self.index[p] for p in products])
+        return self.costs[np.ix_(idx, idx)]
     
     def optimize(self, products, wagons_per_product=None):
         """Find optimal production sequence"""
@@ -78,8 +99,8 @@ class ProductionOptimizer:
             }
         
         # Find optimal sequence
-        if len(products) <= 8:
-            best_seq, best_cost = self._exhaustive_search(products)
+        if len(products) <= 15:
+            best_seq, best_cost = self._held_karp_search(products)
         else:
             best_seq, best_cost = self._greedy_search(products)
         
@@ -89,23 +110,34 @@ class ProductionOptimizer:
         
         savings = ((worst_cost - best_cost) / worst_cost * 100) if worst_cost > 0 else 0
         
-        # Build transition details
-        transitions = []
-        for i in range(len(best_seq) - 1):
-            from_prod = best_seq[i]
-            to_prod = best_seq[i+1]
-            
-            transitions.append({
-                "from": from_prod,
-                "to": to_prod,
-                "cost_kwh": self.transitions[from_prod][to_prod],
-                "thickness_change": self.profiles[to_prod]['thickness_mm'] - self.profiles[from_prod]['thickness_mm'],
-                "type_change": self.profiles[from_prod]['type'] != self.profiles[to_prod]['type'],
-                "energy_change": self.profiles[to_prod]['avg_kwh_per_m3'] - self.profiles[from_prod]['avg_kwh_per_m3']
-            })
+        # Per-transition values from arrays - each profile is looked up once
+        seq_profiles = [self.profiles[p] for p in best_seq]
+        idx = np.array([self.index[p] for p in best_seq])
+        thickness = np.array([p['thickness_mm'] for p in seq_profiles])
+        types = np.array([p['type'] for p in seq_profiles])
+        energy = np.array([p['avg_kwh_per_m3'] for p in seq_profiles], dtype=float)
+        
+        cost = self.costs[idx[:-1], idx[1:]]
+        thickness_change = np.diff(thickness)
+        type_change = types[:-1] != types[1:]
+        energy_change = np.diff(energy)
+        
+        transitions = [
+            {
+                "from": best_seq[i],
+                "to": best_seq[i+1],
+                "cost_kwh": float(cost[i]),
+                "thickness_change": int(thickness_change[i]),
+                "type_change": bool(type_change[i]),
+                "energy_change": float(energy_change[i])
+            }
+            for i in range(len(best_seq) - 1)
+        ]
         
         # Generate recommendations
-        recommendations = self._generate_recommendations(transitions, wagons_per_product)
+        recommendations = self._generate_recommendations(
+            transitions, cost, type_change, thickness_change, wagons_per_product
+        )
         
         # Estimate energy
         estimated_energy = None
@@ -130,34 +162,30 @@ class ProductionOptimizer:
             "estimated_total_energy": estimated_energy
         }
     
-    def _exhaustive_search(self, products):
-        """Try all permutations for small sets"""
-        best_seq = None
-        best_cost = float('inf')
-        
-        for perm in permutations(products):
-            cost = self._calculate_cost(perm)
-            if cost < best_cost:
-                best_cost = cost
-                best_seq = list(perm)
-        
-        return best_seq, best_cost
+    def _held_karp_search(self, products):
+        """Exact shortest open path over all products (Held-Karp bitmask DP)"""
+        order, best_cost = held_karp(self._cost_matrix(products))
+        return [products[i] for i in order], float(best_cost)
     
     def _greedy_search(self, products):
-        """Greedy nearest neighbor for larger sets"""
-        remaining = set(products)
+        """Greedy nearest neighbor for larger sets, refined with 2-opt"""
+        costs = self._cost_matrix(products)
+        thickness = np.array([self.profiles[p]['thickness_mm'] for p in products])
+        visited = np.zeros(len(products), dtype=bool)
         
         # Start with thinnest product
-        current = min(remaining, key=lambda p: self.profiles[p]['thickness_mm'])
-        sequence = [current]
-        remaining.remove(current)
+        current = int(np.argmin(thickness))
+        order = [current]
+        visited[current] = True
+        
+        # Build sequence greedily - visited products are masked out of the row
+        while not visited.all():
+            current = int(np.argmin(np.where(visited, np.inf, costs[current])))
+            order.append(current)
+            visited[current] = True
         
-        # Build sequence greedily
-        while remaining:
-            next_prod = min(remaining, key=lambda p: self.transitions[current][p])
-            sequence.append(next_prod)
-            remaining.remove(next_prod)
-            current = next_prod
+        order = two_opt(np.array(order, dtype=np.int64), costs)
+        sequence = [products[i] for i in order]
         
         return sequence, self._calculate_cost(sequence)
     
@@ -170,24 +198,30 @@ class ProductionOptimizer:
             for i in range(len(sequence)-1)
         )
     
-    def _generate_recommendations(self, transitions, wagons_per_product):
+    def _generate_recommendations(self, transitions, cost, type_change, thickness_change, wagons_per_product):
         """Generate recommendations"""
         recs = []
         
-        for trans in transitions:
-            if trans['cost_kwh'] > 100:
+        high_cost = cost > 100
+        big_step = np.abs(thickness_change) > 8
+        
+        # Only transitions with at least one finding need a message
+        for i in np.flatnonzero(high_cost | type_change | big_step):
+            trans = transitions[i]
+            
+            if high_cost[i]:
                 recs.append(
                     f"⚠️ High transition cost: {trans['from']} → {trans['to']} "
                     f"({trans['cost_kwh']:.1f} kWh). Allow extra setup time."
                 )
             
-            if trans['type_change']:
+            if type_change[i]:
                 recs.append(
                     f"🔧 Material change: {trans['from']} → {trans['to']}. "
                     f"Schedule cleaning and quality check."
                 )
             
-            if abs(trans['thickness_change']) > 8:
+            if big_step[i]:
                 recs.append(
                     f"📏 Large thickness change: {trans['from']} → {trans['to']} "
                     f"({trans['thickness_change']:+d}mm). Monitor dryer settings."
@@ -258,8 +292,28 @@ if not db_loaded:
 
 st.success("✅ Optimization database loaded successfully")
 
-# Initialize optimizer
-optimizer = ProductionOptimizer(database)
+# Initialize optimizer - built once per process, it precomputes the cost matrix
+@st.cache_resource
+def load_optimizer():
+    """Build the optimizer for the loaded database"""
+    return ProductionOptimizer(load_database()[0])
+
+optimizer = load_optimizer()
+
+@st.cache_data(show_spinner=False)
+def build_energy_profile_chart(profile_df):
+    """Build the energy profile line chart - cached on the sequence profile"""
+    fig = px.line(
+        profile_df,
+        x='Position',
+        y='Energy (kWh/m³)',
+        text='Product',
+        markers=True,
+        title="Energy Consumption Through Production Sequence"
+    )
+    fig.update_traces(textposition="top center", line=dict(width=3))
+    fig.update_layout(height=400, plot_bgcolor='white')
+    return fig
 
 # ------------------ Sidebar ------------------
 with st.sidebar:
@@ -300,149 +354,137 @@ if optimize_button:
     if not weekly_demand:
         st.warning("⚠️ Please enter production quantities for at least one product")
     else:
+        # Only the search runs under the spinner - results render after it
         with st.spinner("🔄 Calculating optimal sequence..."):
-            
             products_to_optimize = list(weekly_demand.keys())
             result = optimizer.optimize(products_to_optimize, weekly_demand)
+        
+        if 'error' in result:
+            st.error(f"❌ {result['error']}")
+        else:
+            # Display optimal sequence
+            st.markdown("### 🏆 Optimal Production Sequence")
             
-            if 'error' in result:
-                st.error(f"❌ {result['error']}")
-            else:
-                # Display optimal sequence
-                st.markdown("### 🏆 Optimal Production Sequence")
-                
-                sequence_html = f'''
+            sequence_html = f'''
                 <div class="sequence-box">
                     {' → '.join(result['optimal_sequence'])}
                 </div>
                 '''
-                st.markdown(sequence_html, unsafe_allow_html=True)
-                
-                # Metrics
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    st.metric(
-                        "Transition Cost",
-                        f"{result['total_transition_cost']:.1f} kWh",
-                        help="Energy cost of all transitions"
-                    )
-                
-                with col2:
+            st.markdown(sequence_html, unsafe_allow_html=True)
+            
+            # Metrics
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                st.metric(
+                    "Transition Cost",
+                    f"{result['total_transition_cost']:.1f} kWh",
+                    help="Energy cost of all transitions"
+                )
+            
+            with col2:
+                st.metric(
+                    "Savings",
+                    f"{result['savings_percent']:.1f}%",
+                    delta="vs worst case",
+                    help="Energy saved vs random sequence"
+                )
+            
+            with col3:
+                if result['estimated_total_energy']:
                     st.metric(
-                        "Savings",
-                        f"{result['savings_percent']:.1f}%",
-                        delta="vs worst case",
-                        help="Energy saved vs random sequence"
+                        "Total Energy",
+                        f"{result['estimated_total_energy']['total_kwh']:,.0f} kWh",
+                        help="Production + transition energy"
                     )
-                
-                with col3:
-                    if result['estimated_total_energy']:
-                        st.metric(
-                            "Total Energy",
-                            f"{result['estimated_total_energy']['total_kwh']:,.0f} kWh",
-                            help="Production + transition energy"
-                        )
-                
-                # Transition details
-                st.markdown("### 📋 Transition Analysis")
-                
-                transitions_data = []
-                for trans in result['transitions']:
-                    transitions_data.append({
-                        'From': trans['from'],
-                        'To': trans['to'],
-                        'Cost (kWh)': f"{trans['cost_kwh']:.1f}",
-                        'Thickness Δ (mm)': f"{trans['thickness_change']:+d}",
-                        'Type Change': '✓' if trans['type_change'] else '',
-                        'Energy Δ (kWh/m³)': f"{trans['energy_change']:+.1f}"
-                    })
-                
-                transitions_df = pd.DataFrame(transitions_data)
-                st.dataframe(transitions_df, use_container_width=True)
-                
-                # Visualization
-                st.markdown("### 📈 Energy Profile")
-                
-                energy_profile = []
-                for i, product in enumerate(result['optimal_sequence']):
+            
+            # Transition details
+            st.markdown("### 📋 Transition Analysis")
+            
+            transitions_data = []
+            for trans in result['transitions']:
+                transitions_data.append({
+                    'From': trans['from'],
+                    'To': trans['to'],
+                    'Cost (kWh)': f"{trans['cost_kwh']:.1f}",
+                    'Thickness Δ (mm)': f"{trans['thickness_change']:+d}",
+                    'Type Change': '✓' if trans['type_change'] else '',
+                    'Energy Δ (kWh/m³)': f"{trans['energy_change']:+.1f}"
+                })
+            
+            transitions_df = pd.DataFrame(transitions_data)
+            st.dataframe(transitions_df, use_container_width=True)
+            
+            # Visualization
+            st.markdown("### 📈 Energy Profile")
+            
+            energy_profile = []
+            for i, product in enumerate(result['optimal_sequence']):
+                profile = optimizer.get_product_info(product)
+                energy_profile.append({
+                    'Position': i + 1,
+                    'Product': product,
+                    'Energy (kWh/m³)': profile['avg_kwh_per_m3'],
+                    'Wagons': weekly_demand.get(product, 0)
+                })
+            
+            profile_df = pd.DataFrame(energy_profile)
+            
+            fig = build_energy_profile_chart(profile_df)
+            st.plotly_chart(fig, use_container_width=True)
+            
+            # Recommendations
+            st.markdown("### 💡 Production Recommendations")
+            
+            # One element for all recommendations instead of one per line
+            st.info("\n\n".join(result['recommendations']))
+            
+            # Product details
+            with st.expander("📊 Product Energy Profiles"):
+                product_details = []
+                for product in result['optimal_sequence']:
                     profile = optimizer.get_product_info(product)
-                    energy_profile.append({
-                        'Position': i + 1,
+                    product_details.append({
                         'Product': product,
-                        'Energy (kWh/m³)': profile['avg_kwh_per_m3'],
-                        'Wagons': weekly_demand.get(product, 0)
+                        'Type': profile['type'],
+                        'Thickness (mm)': profile['thickness_mm'],
+                        'kWh/m³': f"{profile['avg_kwh_per_m3']:.2f}",
+                        'kWh/Wagon': f"{profile['kwh_per_wagon']:.1f}",
+                        'Wagons': weekly_demand.get(product, 0),
+                        'Total Energy': f"{profile['kwh_per_wagon'] * weekly_demand.get(product, 0):.0f} kWh"
                     })
                 
-                profile_df = pd.DataFrame(energy_profile)
+                details_df = pd.DataFrame(product_details)
+                st.dataframe(details_df, use_container_width=True)
+            
+            # Export
+            st.markdown("### 📥 Export Production Plan")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                # Excel export - built in memory, no temporary file on disk
+                excel_file = io.BytesIO()
+                with pd.ExcelWriter(excel_file, engine='xlsxwriter') as writer:
+                    seq_df = pd.DataFrame({
+                        'Position': range(1, len(result['optimal_sequence']) + 1),
+                        'Product': result['optimal_sequence']
+                    })
+                    seq_df.to_excel(writer, sheet_name='Sequence', index=False)
+                    transitions_df.to_excel(writer, sheet_name='Transitions', index=False)
+                    details_df.to_excel(writer, sheet_name='Product_Details', index=False)
                 
-                fig = px.line(
-                    profile_df,
-                    x='Position',
-                    y='Energy (kWh/m³)',
-                    text='Product',
-                    markers=True,
-                    title="Energy Consumption Through Production Sequence"
+                st.download_button(
+                    "📥 Download Excel Plan",
+                    excel_file.getvalue(),
+                    "Production_Plan.xlsx",
+                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    use_container_width=True
                 )
-                fig.update_traces(textposition="top center", line=dict(width=3))
-                fig.update_layout(height=400, plot_bgcolor='white')
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Recommendations
-                st.markdown("### 💡 Production Recommendations")
-                
-                for rec in result['recommendations']:
-                    st.info(rec)
-                
-                # Product details
-                with st.expander("📊 Product Energy Profiles"):
-                    product_details = []
-                    for product in result['optimal_sequence']:
-                        profile = optimizer.get_product_info(product)
-                        product_details.append({
-                            'Product': product,
-                            'Type': profile['type'],
-                            'Thickness (mm)': profile['thickness_mm'],
-                            'kWh/m³': f"{profile['avg_kwh_per_m3']:.2f}",
-                            'kWh/Wagon': f"{profile['kwh_per_wagon']:.1f}",
-                            'Wagons': weekly_demand.get(product, 0),
-                            'Total Energy': f"{profile['kwh_per_wagon'] * weekly_demand.get(product, 0):.0f} kWh"
-                        })
-                    
-                    details_df = pd.DataFrame(product_details)
-                    st.dataframe(details_df, use_container_width=True)
-                
-                # Export
-                st.markdown("### 📥 Export Production Plan")
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    # Excel export
-                    excel_file = "Production_Plan.xlsx"
-                    with pd.ExcelWriter(excel_file, engine='xlsxwriter') as writer:
-                        seq_df = pd.DataFrame({
-                            'Position': range(1, len(result['optimal_sequence']) + 1),
-                            'Product': result['optimal_sequence']
-                        })
-                        seq_df.to_excel(writer, sheet_name='Sequence', index=False)
-                        transitions_df.to_excel(writer, sheet_name='Transitions', index=False)
-                        details_df.to_excel(writer, sheet_name='Product_Details', index=False)
-                    
-                    with open(excel_file, 'rb') as f:
-                        st.download_button(
-                            "📥 Download Excel Plan",
-                            f.read(),
-                            excel_file,
-                            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True
-                        )
-                    
-                    os.unlink(excel_file)
-                
-                with col2:
-                    # Text report
-                    report = f"""
+            
+            with col2:
+                # Text report
+                report = f"""
 LINDNER DRYER - PRODUCTION PLAN
 Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}
 {'='*50}
@@ -462,16 +504,16 @@ WEEKLY DEMAND:
 RECOMMENDATIONS:
 {chr(10).join([f'  • {rec}' for rec in result['recommendations']])}
                     """
-                    
-                    st.download_button(
-                        "📄 Download Text Report",
-                        report,
-                        "production_plan.txt",
-                        "text/plain",
-                        use_container_width=True
-                    )
                 
-                st.success("✅ Optimization complete!")
+                st.download_button(
+                    "📄 Download Text Report",
+                    report,
+                    "production_plan.txt",
+                    "text/plain",
+                    use_container_width=True
+                )
+            
+            st.success("✅ Optimization complete!")
 
 else:
     # Instructions
@@ -7,7 +7,8 @@ import pandas as pd
 import numpy as np
 import json
 from datetime import datetime
-from dryer_kpi_monthly_final import parse_energy, parse_wagon, explode_intervals, allocate_energy, CONFIG
+from core.dryer_kpi_monthly_final import explode_intervals, allocate_energy
+from core.io_cache import load_energy_cached, load_wagon_cached
 
 class OptimizationDatabaseBuilder:
     def __init__(self, energy_file, wagon_file):
@@ -15,23 +16,20 @@ class OptimizationDatabaseBuilder:
         self.energy_file = energy_file
         self.wagon_file = wagon_file
         self.product_profiles = {}
+        self.transition_matrix = None
         
     def analyze_all_data(self):
         """Analyze complete historical data"""
+        # New profiles invalidate a previously calculated matrix
+        self.transition_matrix = None
         print("🔄 Loading and parsing data files...")
         
-        # Load energy data
-        e_raw = pd.read_excel(self.energy_file, sheet_name=CONFIG["energy_sheet"])
-        e = parse_energy(e_raw)
+        # Load energy data (reuses the parsed Parquet snapshot when unchanged)
+        e = load_energy_cached(self.energy_file)
         print(f"✅ Loaded {len(e)} energy records")
         
         # Load wagon data
-        w_raw = pd.read_excel(
-            self.wagon_file,
-            sheet_name=CONFIG["wagon_sheet"],
-            header=CONFIG["wagon_header_row"]
-        )
-        w = parse_wagon(w_raw)
+        w = load_wagon_cached(self.wagon_file)
         print(f"✅ Loaded {len(w)} wagon records")
         
         # Process intervals
@@ -47,20 +45,8 @@ class OptimizationDatabaseBuilder:
         # Create comprehensive summary
         print("🔄 Creating product profiles...")
         
-        # Overall product summary
-        product_summary = alloc.groupby("Produkt").agg({
-            "Energy_share_kWh": "sum",
-            "m3": "sum",
-            "Overlap_h": "sum"
-        }).reset_index()
-        
-        product_summary["kWh_per_m3"] = (
-            product_summary["Energy_share_kWh"] / 
-            product_summary["m3"].replace(0, np.nan)
-        )
-        
         # Zone-specific data
-        zone_summary = alloc.groupby(["Produkt", "Zone"]).agg({
+        zone_summary = alloc.groupby(["Produkt", "Zone"], observed=True).agg({
             "Energy_share_kWh": ["sum", "mean", "std"],
             "m3": "sum",
             "Overlap_h": "sum"
@@ -72,14 +58,31 @@ class OptimizationDatabaseBuilder:
             'Total_Volume_m3', 'Total_Hours'
         ]
         
-        zone_summary["kWh_per_m3"] = (
-            zone_summary["Total_Energy_kWh"] / 
-            zone_summary["Total_Volume_m3"].replace(0, np.nan)
+        energy = zone_summary["Total_Energy_kWh"].to_numpy()
+        volume = zone_summary["Total_Volume_m3"].to_numpy()
+        zone_summary["kWh_per_m3"] = np.divide(
+            energy, volume, out=np.full(energy.shape, np.nan), where=volume != 0
+        )
+        
+        # Overall product summary, rolled up from the zone sums
+        product_summary = zone_summary.groupby("Produkt", observed=True, as_index=False).agg(
+            Energy_share_kWh=("Total_Energy_kWh", "sum"),
+            m3=("Total_Volume_m3", "sum"),
+            Overlap_h=("Total_Hours", "sum")
+        )
+        
+        energy = product_summary["Energy_share_kWh"].to_numpy()
+        volume = product_summary["m3"].to_numpy()
+        product_summary["kWh_per_m3"] = np.divide(
+            energy, volume, out=np.full(energy.shape, np.nan), where=volume != 0
         )
         
         # Build product profiles
         products = product_summary["Produkt"].unique()
         
+        # Count production runs per product in a single pass
+        wagon_counts = w["Produkt"].value_counts()
+        
         for product in products:
             print(f"  📊 Profiling {product}...")
             
@@ -90,7 +93,7 @@ class OptimizationDatabaseBuilder:
             zone_data = zone_summary[zone_summary["Produkt"] == product]
             
             # Count production runs
-            wagon_count = len(w[w["Produkt"] == product])
+            wagon_count = int(wagon_counts.get(product, 0))
             
             # Get product characteristics
             thickness = self._extract_thickness(product)
@@ -123,14 +126,13 @@ class OptimizationDatabaseBuilder:
             }
             
             # Add zone-specific profiles
-            for _, zone_row in zone_data.iterrows():
-                zone = zone_row['Zone']
-                profile["zone_profiles"][zone] = {
-                    "total_energy_kwh": float(zone_row['Total_Energy_kWh']),
-                    "avg_energy_kwh": float(zone_row['Avg_Energy_kWh']),
-                    "std_energy_kwh": float(zone_row['Std_Energy_kWh']) if pd.notna(zone_row['Std_Energy_kWh']) else 0,
-                    "kwh_per_m3": float(zone_row['kWh_per_m3']) if pd.notna(zone_row['kWh_per_m3']) else 0,
-                    "total_hours": float(zone_row['Total_Hours'])
+            for zone_row in zone_data.itertuples(index=False):
+                profile["zone_profiles"][zone_row.Zone] = {
+                    "total_energy_kwh": float(zone_row.Total_Energy_kWh),
+                    "avg_energy_kwh": float(zone_row.Avg_Energy_kWh),
+                    "std_energy_kwh": float(zone_row.Std_Energy_kWh) if pd.notna(zone_row.Std_Energy_kWh) else 0,
+                    "kwh_per_m3": float(zone_row.kWh_per_m3) if pd.notna(zone_row.kWh_per_m3) else 0,
+                    "total_hours": float(zone_row.Total_Hours)
                 }
             
             self.product_profiles[product] = profile
@@ -144,50 +146,56 @@ class OptimizationDatabaseBuilder:
         print("\n🔄 Calculating transition cost matrix...")
         
         products = list(self.product_profiles.keys())
-        transition_matrix = {}
+        costs = self._transition_cost_matrix(products)
         
-        for prod1 in products:
-            transition_matrix[prod1] = {}
-            for prod2 in products:
-                if prod1 == prod2:
-                    transition_matrix[prod1][prod2] = 0
-                else:
-                    cost = self._calculate_transition_cost(prod1, prod2)
-                    transition_matrix[prod1][prod2] = cost
+        transition_matrix = {
+            prod1: dict(zip(products, row))
+            for prod1, row in zip(products, costs.tolist())
+        }
         
         print(f"✅ Calculated {len(products)}x{len(products)} transition matrix")
         
+        # Kept for the Excel report, which shows the same matrix
+        self.transition_matrix = transition_matrix
         return transition_matrix
     
-    def _calculate_transition_cost(self, prod1, prod2):
-        """Calculate transition cost based on real data"""
-        profile1 = self.product_profiles[prod1]
-        profile2 = self.product_profiles[prod2]
-        
-        cost = 0
+    def _transition_cost_matrix(self, products):
+        """
+        Calculate transition costs based on real data for all product pairs.
+        
+        The cost is symmetric and zero on the diagonal, so only the upper
+        triangle is evaluated and then mirrored.
+        """
+        n = len(products)
+        zones = ['Z2', 'Z3', 'Z4', 'Z5']
+        profiles = [self.product_profiles[p] for p in products]
+        
+        thickness = np.array([p['thickness_mm'] for p in profiles], dtype=float)
+        types = np.array([p['type'] for p in profiles])
+        energy = np.array([p['avg_kwh_per_m3'] for p in profiles], dtype=float)
+        zone_kpi = np.array([
+            [p['zone_profiles'][z]['kwh_per_m3'] if z in p['zone_profiles'] else np.nan
+             for z in zones]
+            for p in profiles
+        ], dtype=float).reshape(n, len(zones))
+        
+        i, j = np.triu_indices(n, 1)
         
         # 1. Thickness difference cost (physical setup)
-        thickness_diff = abs(profile1['thickness_mm'] - profile2['thickness_mm'])
-        cost += thickness_diff * 3.0  # 3 kWh per mm
+        cost = np.abs(thickness[i] - thickness[j]) * 3.0  # 3 kWh per mm
         
         # 2. Type change penalty (cleaning needed)
-        if profile1['type'] != profile2['type']:
-            cost += 50  # Fixed penalty for material type change
+        cost += (types[i] != types[j]) * 50  # Fixed penalty for material type change
         
         # 3. Energy consumption difference (temperature adjustment)
-        energy_diff = abs(profile1['avg_kwh_per_m3'] - profile2['avg_kwh_per_m3'])
-        cost += energy_diff * 0.8
-        
-        # 4. Zone temperature differences
-        for zone in ['Z2', 'Z3', 'Z4', 'Z5']:
-            if zone in profile1['zone_profiles'] and zone in profile2['zone_profiles']:
-                zone_energy_diff = abs(
-                    profile1['zone_profiles'][zone]['kwh_per_m3'] - 
-                    profile2['zone_profiles'][zone]['kwh_per_m3']
-                )
-                cost += zone_energy_diff * 0.2
-        
-        return round(cost, 2)
+        cost += np.abs(energy[i] - energy[j]) * 0.8
+        
+        # 4. Zone temperature differences (only zones both products passed through)
+        cost += np.nansum(np.abs(zone_kpi[i] - zone_kpi[j]), axis=1) * 0.2
+        
+        matrix = np.zeros((n, n))
+        matrix[i, j] = np.round(cost, 2)
+        return matrix + matrix.T
     
     def generate_optimization_rules(self):
         """Generate optimization rules based on data"""
@@ -308,8 +316,10 @@ class OptimizationDatabaseBuilder:
             df_profiles = pd.DataFrame(profiles_data)
             df_profiles.to_excel(writer, sheet_name='Product_Profiles', index=False)
             
-            # Transition matrix
-            transition_matrix = self.calculate_transition_matrix()
+            # Transition matrix - reuse the one saved to the database
+            transition_matrix = self.transition_matrix
+            if transition_matrix is None:
+                transition_matrix = self.calculate_transition_matrix()
             df_transitions = pd.DataFrame(transition_matrix)
             df_transitions.to_excel(writer, sheet_name='Transition_Matrix')
             
@@ -2,21 +2,29 @@
 Core modules for Dryer KPI analysis and optimization
 """
 
-from .dryer_kpi_monthly_final import (
-    parse_energy,
-    parse_wagon,
-    explode_intervals,
-    allocate_energy,
-    CONFIG
-)
+import importlib
 
-from .simple_optimizer import SimpleProductionOptimizer
+# Names are imported from their submodule on first access, so loading one
+# submodule (e.g. core.sequencing from the optimizer app) does not pull in the
+# KPI pipeline with its logging setup and Excel dependencies
+_EXPORTS = {
+    'parse_energy': 'dryer_kpi_monthly_final',
+    'parse_wagon': 'dryer_kpi_monthly_final',
+    'explode_intervals': 'dryer_kpi_monthly_final',
+    'allocate_energy': 'dryer_kpi_monthly_final',
+    'CONFIG': 'dryer_kpi_monthly_final',
+    'load_energy_cached': 'io_cache',
+    'load_wagon_cached': 'io_cache',
+    'held_karp': 'sequencing',
+    'two_opt': 'sequencing',
+    'lookahead_sequence': 'sequencing'
+}
 
-__all__ = [
-    'parse_energy',
-    'parse_wagon',
-    'explode_intervals',
-    'allocate_energy',
-    'CONFIG',
-    'SimpleProductionOptimizer'
-]
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+
+
+__all__ = list(_EXPORTS)
@@ -3,12 +3,35 @@ Lindner Dryer KPI Calculation Module (Refactored)
 Calculates energy efficiency KPIs for dryer zones by allocating energy consumption to products.
 """
 
+import os
 import pandas as pd
 import numpy as np
 from pathlib import Path
 import xlsxwriter
 import logging
-from typing import Dict, Optional, List, Tuple
+import re
+import datetime
+from typing import Callable, Dict, Optional, List, Tuple
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    # numba is optional - without it the NumPy fallbacks are used
+    HAS_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+try:
+    import python_calamine  # noqa: F401
+    # Rust-backed reader, much faster than openpyxl on large workbooks
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = None  # pandas default (openpyxl)
 
 # Configure logging
 logging.basicConfig(
@@ -24,12 +47,29 @@ CONFIG = {
     "wagon_file": r"E:\Lindner\Python\Hordenwagenverfolgung_Stand 2025_10_12.xlsm",
     "wagon_sheet": "Hordenwagenverfolgung",
     "wagon_header_row": 6,
+    # Only these columns are kept from the workbooks (names after newline/space
+    # normalization; the wagon number column is matched on its "WG-" prefix).
+    # The engines still read every cell - this saves memory and dtype inference
+    "energy_usecols": [
+        "Zeitstempel", "Energieverbrauch, elektr. [kWh]",
+        "Gasmenge, Zone 2 [m³]", "Gasmenge, Zone 3 [m³]",
+        "Gasmenge, Zone 4 [m³]", "Gasmenge, Zone 5 [m³]",
+    ],
+    "wagon_usecols": [
+        "Pressdat. + Zeit", "Pressen-Datum", "Press-Zeit", "Entnahme-Zeit",
+        "Produkt", "Rezept", "Stärke", "m³",
+        "In Z2", "In Z3", "In Z4", "In Z5",
+        "Zeit in Z1", "Zeit in Z2", "Zeit in Z3", "Zeit in Z4", "Zeit in Z5",
+    ],
     "gas_to_kwh": 11.5,
     "takt_minutes": 65,
     "zones_seq": ["Z1", "Z2", "Z3", "Z4", "Z5"],
     "product_filter": ["L36"],
     "month_filter": None,
-    "output_file": r"E:\Lindner\Python\Dryer_KPI_Monthly_Results.xlsx"
+    "output_file": r"E:\Lindner\Python\Dryer_KPI_Monthly_Results.xlsx",
+    # Machine-readable intermediates, too large to be useful as Excel sheets
+    "intervals_file": r"E:\Lindner\Python\Dryer_KPI_Intervals_By_Zone.parquet",
+    "allocation_file": r"E:\Lindner\Python\Dryer_KPI_Energy_Allocated.parquet"
 }
 
 # Zone to column mapping
@@ -40,6 +80,99 @@ ZONE_ENERGY_MAPPING = {
     "Z5": "Zone 5"
 }
 
+# Nanoseconds per hour, for int64 datetime arithmetic
+NS_PER_HOUR = 3.6e12
+
+
+def _as_ns(s: pd.Series) -> np.ndarray:
+    """Return datetime values as int64 nanoseconds since epoch"""
+    return s.to_numpy(dtype="datetime64[ns]").view("i8")
+
+
+def _kwh_per_m3(df: pd.DataFrame) -> np.ndarray:
+    """Return Energy_kWh / Volume_m3, NaN where the volume is zero"""
+    energy = df["Energy_kWh"].to_numpy(dtype=float)
+    volume = df["Volume_m3"].to_numpy(dtype=float)
+    return np.divide(energy, volume, out=np.full(energy.shape, np.nan), where=volume != 0)
+
+
+def _write_parquet(df: pd.DataFrame, path: str, name: str) -> None:
+    """
+    Write an intermediate table to Parquet without aborting the run on failure.
+    
+    Product labels are written as text, since Arrow cannot store categories that
+    mix numbers and strings. Other failures are logged so the Excel report is
+    still written.
+    
+    Args:
+        df: Table to write, e.g. the zone intervals
+        path: Output Parquet file
+        name: Table description used in log messages
+    """
+    logger.info(f"Writing {name} to: {path}")
+    try:
+        if "Produkt" in df.columns and isinstance(df["Produkt"].dtype, pd.CategoricalDtype):
+            df = df.assign(Produkt=df["Produkt"].cat.rename_categories(str))
+        df.to_parquet(path, index=False)
+    except Exception as e:
+        logger.warning(f"Could not write {name}: {str(e)}")
+
+
+def column_selector(names: List[str]) -> Callable[[str], bool]:
+    """
+    Build a read_excel usecols callable for the given column names.
+    
+    Header cells are compared after the same normalization parse_wagon applies,
+    so names containing line breaks still match. pandas applies the callable
+    after the engine has read the sheet, so other columns are dropped before
+    the frame is built but are still parsed from the workbook.
+    
+    Args:
+        names: Column names to read, e.g. CONFIG["wagon_usecols"]
+        
+    Returns:
+        Callable returning True for columns to keep
+    """
+    wanted = set(names)
+    
+    def select(col) -> bool:
+        col = str(col).replace("\n", " ").strip()
+        return col in wanted or col.startswith("WG-")
+    
+    return select
+
+
+def read_excel(source, **kwargs) -> pd.DataFrame:
+    """
+    Read a workbook with EXCEL_ENGINE, retrying with openpyxl if calamine fails.
+    
+    calamine is much faster but can reject workbooks openpyxl still reads
+    (unusual styles, some xlsm files), so a failure only costs the fast path.
+    
+    Args:
+        source: Path or file-like object of the workbook
+        kwargs: Further pd.read_excel arguments, e.g. sheet_name, header, usecols
+        
+    Returns:
+        Raw sheet dataframe
+    """
+    if EXCEL_ENGINE != "calamine":
+        return pd.read_excel(source, engine=EXCEL_ENGINE, **kwargs)
+    
+    try:
+        return pd.read_excel(source, engine="calamine", **kwargs)
+    except Exception as e:
+        name = source if isinstance(source, (str, os.PathLike)) else type(source).__name__
+        logger.warning(f"calamine could not read {name}, falling back to openpyxl: {str(e)}")
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return pd.read_excel(source, engine="openpyxl", **kwargs)
+
+
+# Decimal commas and unit abbreviations in duration text, replaced in one pass
+DURATION_TOKENS = {",": ".", "h": "hours", "min": "minutes", "st": "seconds"}
+DURATION_PATTERN = re.compile(r",|\b(?:h|min|st)\b")
+
 
 def parse_duration_series(s: pd.Series) -> pd.Series:
     """
@@ -54,16 +187,11 @@ def parse_duration_series(s: pd.Series) -> pd.Series:
     """
     s = s.astype(str).str.strip()
     
-    # Replace commas with periods for decimal parsing
-    s = s.str.replace(',', '.', regex=False)
-    
-    # Normalize common abbreviations
-    s = s.str.replace(r'\bh\b', 'hours', regex=True)
-    s = s.str.replace(r'\bmin\b', 'minutes', regex=True)
-    s = s.str.replace(r'\bst\b', 'seconds', regex=True)
+    # Decimal commas to periods, abbreviations to full unit names
+    s = s.str.replace(DURATION_PATTERN, lambda m: DURATION_TOKENS[m.group()], regex=True)
     
     # Handle empty/null values
-    s = s.replace({r'^\s*$': np.nan, r'^-$': np.nan}, regex=True)
+    s = s.mask(s.isin(["", "-"]))
     
     # Try pandas timedelta parsing first
     td = pd.to_timedelta(s, errors='coerce')
@@ -78,35 +206,42 @@ def parse_duration_series(s: pd.Series) -> pd.Series:
     return td
 
 
-def parse_energy(df: pd.DataFrame) -> pd.DataFrame:
+def parse_energy(df: pd.DataFrame, copy: bool = False) -> pd.DataFrame:
     """
     Parse hourly energy consumption data.
     
     Args:
         df: Raw energy dataframe
+        copy: The input frame may be modified; pass copy=True to keep it intact
         
     Returns:
         Parsed energy dataframe with standardized columns
     """
     logger.info("Parsing energy data...")
-    df = df.copy()
+    if copy:
+        df = df.copy()
     
     # Parse timestamp
     df["Zeitstempel"] = pd.to_datetime(df["Zeitstempel"], errors='coerce')
     df["Month"] = df["Zeitstempel"].dt.month
     df["Year"] = df["Zeitstempel"].dt.year
     
-    # Convert gas consumption to kWh for each zone
+    # Convert gas consumption to kWh for each zone, replacing the m³ columns
+    gas_cols = {}
     for zone_key, zone_name in ZONE_ENERGY_MAPPING.items():
         gas_col = f"Gasmenge, {zone_name} [m³]"
-        energy_col = f"E_{zone_name}_kWh"
         
         if gas_col in df.columns:
-            df[energy_col] = df[gas_col] * CONFIG["gas_to_kwh"]
-            logger.info(f"Converted {gas_col} to {energy_col}")
+            gas_cols[gas_col] = f"E_{zone_name}_kWh"
         else:
             logger.warning(f"Column {gas_col} not found in energy data")
     
+    if gas_cols:
+        energy = df[list(gas_cols)].to_numpy(dtype=float) * CONFIG["gas_to_kwh"]
+        df = df.drop(columns=list(gas_cols))
+        df[list(gas_cols.values())] = energy
+        logger.info(f"Converted {len(gas_cols)} gas columns to kWh")
+    
     # Parse electrical energy
     if "Energieverbrauch, elektr. [kWh]" in df.columns:
         df["E_el_kWh"] = df["Energieverbrauch, elektr. [kWh]"]
@@ -115,25 +250,29 @@ def parse_energy(df: pd.DataFrame) -> pd.DataFrame:
     df["E_start"] = df["Zeitstempel"]
     df["E_end"] = df["Zeitstempel"] + pd.Timedelta(hours=1)
     
-    # Remove rows with invalid timestamps
-    df = df[df["Zeitstempel"].notna()].copy()
+    # Remove rows with invalid timestamps and drop the raw input columns
+    keep_cols = ["Zeitstempel", "Month", "Year", *gas_cols.values(), "E_el_kWh", "E_start", "E_end"]
+    df = df.loc[df["Zeitstempel"].notna(), [c for c in keep_cols if c in df.columns]]
+    df = df.astype({"Month": "int8", "Year": "int16"})
     
     logger.info(f"Parsed {len(df)} energy records")
     return df
 
 
-def parse_wagon(df: pd.DataFrame) -> pd.DataFrame:
+def parse_wagon(df: pd.DataFrame, copy: bool = False) -> pd.DataFrame:
     """
     Parse wagon tracking data with zone entry times and durations.
     
     Args:
         df: Raw wagon tracking dataframe
+        copy: The input frame may be modified; pass copy=True to keep it intact
         
     Returns:
         Parsed wagon dataframe with calculated intervals
     """
     logger.info("Parsing wagon data...")
-    df = df.copy()
+    if copy:
+        df = df.copy()
 
     # Normalize column names
     df.columns = [str(c).replace("\n", " ").strip() for c in df.columns]
@@ -196,102 +335,227 @@ def parse_wagon(df: pd.DataFrame) -> pd.DataFrame:
         ("Z5", "Entnahme-Zeit", "Z5_in")
     ]
 
+    one_hour = pd.Timedelta(hours=1)
+
+    # Keep the Timedelta for the intervals, hours for the report
+    durations = {}
     for zone, later_col, earlier_col in duration_pairs:
-        # Calculate duration in hours
-        hours = (df[later_col] - df[earlier_col]).dt.total_seconds() / 3600
-        df[f"{zone}_dur_calc"] = hours
+        durations[zone] = df[later_col] - df[earlier_col]
+        df[f"{zone}_dur_calc"] = durations[zone] / one_hour
 
     # Use parsed text durations when available, otherwise use calculated
     for zone in CONFIG["zones_seq"]:
         text_col = f"Zeit in {zone}"
-        calc_col = f"{zone}_dur_calc"
-        dur_col = f"{zone}_dur"
-
-        # Start with calculated duration (as Timedelta)
-        df[dur_col] = pd.to_timedelta(df[calc_col], unit="h")
+        duration = durations[zone]
 
         # Override with parsed text duration if available and valid
         if text_col in df.columns:
             parsed = parse_duration_series(df[text_col])
             
             # Replace suspicious values (< 1 hour) with calculated
-            mask_replace = parsed.isna() | (parsed.dt.total_seconds() / 3600 < 1)
-            df[dur_col] = parsed.where(~mask_replace, df[dur_col])
+            mask_keep = parsed >= one_hour
+            duration = parsed.where(mask_keep, duration)
+
+        df[f"{zone}_dur"] = duration
 
     # Add month column for aggregation
     df["Month"] = df["t0"].dt.month
     df["Year"] = df["t0"].dt.year
 
     # Filter out invalid records
-    df = df[df["t0"].notna()].copy()
+    df = df[df["t0"].notna()].astype({"Month": "int8", "Year": "int16"})
+    
+    # Few distinct products - store them once and filter/group on codes
+    if "Produkt" in df.columns:
+        df["Produkt"] = df["Produkt"].astype("category")
     
     logger.info(f"Parsed {len(df)} wagon records")
     return df
 
 
-def build_intervals(row: pd.Series) -> List[Tuple[str, pd.Timestamp, pd.Timestamp]]:
+def explode_intervals(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Build time intervals for each zone based on entry times and durations.
+    Explode wagon data into individual zone intervals.
+    
+    A zone without an entry time starts where the previous valid zone
+    ended (or at t0 for the first one). Zones without a positive duration
+    are skipped and do not advance the previous end time.
     
     Args:
-        row: Single wagon record
+        df: Parsed wagon dataframe
         
     Returns:
-        List of (zone, start_time, end_time) tuples
+        Dataframe with one row per zone interval
     """
-    intervals = []
-    prev_end = None
+    logger.info("Exploding wagon data into zone intervals...")
+    blocks = []
+    prev_end = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    
+    staerke = df["Stärke"] if "Stärke" in df.columns else np.nan
+    year = df["Year"] if "Year" in df.columns else np.nan
     
     for zone in CONFIG["zones_seq"]:
-        zone_in = row.get(f"{zone}_in", pd.NaT)
-        
         # Use previous end time if entry time is missing
-        if pd.isna(zone_in):
-            zone_in = prev_end if prev_end is not None else row["t0"]
-        
-        zone_dur = row.get(f"{zone}_dur", pd.NaT)
-        zone_out = zone_in + zone_dur if pd.notna(zone_in) and pd.notna(zone_dur) else pd.NaT
-        
-        # Only add valid intervals
-        if pd.notna(zone_in) and pd.notna(zone_out) and zone_out > zone_in:
-            intervals.append((zone, zone_in, zone_out))
-            prev_end = zone_out
+        zone_in = df[f"{zone}_in"].fillna(prev_end.fillna(df["t0"]))
+        zone_out = zone_in + df[f"{zone}_dur"]
+        
+        # Only keep valid intervals
+        valid = zone_in.notna() & zone_out.notna() & (zone_out > zone_in)
+        prev_end = zone_out.where(valid, prev_end)
+        
+        block = pd.DataFrame({
+            "WG_Nr": df["WG_Nr"],
+            "Produkt": df["Produkt"],
+            "Stärke": staerke,
+            "m3": df["m3"],
+            "Zone": zone,
+            "P_start": zone_in,
+            "P_end": zone_out,
+            "Month": df["Month"],
+            "Year": year
+        }, index=df.index)
+        blocks.append(block[valid])
     
-    return intervals
+    # Restore wagon-major order (stable sort keeps the zone sequence per wagon)
+    result = pd.concat(blocks).sort_index(kind="stable").reset_index(drop=True)
+    
+    # Categorical keys make the downstream groupbys work on integer codes
+    result["Zone"] = pd.Categorical(result["Zone"], categories=CONFIG["zones_seq"])
+    result["Produkt"] = result["Produkt"].astype("category")
+    logger.info(f"Created {len(result)} zone intervals")
+    return result
 
 
-def explode_intervals(df: pd.DataFrame) -> pd.DataFrame:
+@njit(cache=True, parallel=True)
+def _overlap_kernel(e_start, e_end, p_start, p_end, p_end_max):
     """
-    Explode wagon data into individual zone intervals.
+    Find all (energy hour, interval) pairs of one zone that overlap in time.
+    
+    Hours and intervals must both be sorted by start time; p_end_max is the
+    running maximum of the interval end times. One merge-style sweep with
+    two cursors finds each hour's window of active intervals, so only
+    those are checked instead of the full cross join. Hours are then
+    processed in parallel: a counting pass sizes each hour's output slot,
+    a second pass fills the slots.
     
     Args:
-        df: Parsed wagon dataframe
+        e_start, e_end: Energy window bounds sorted by e_start (int64 ns)
+        p_start, p_end: Interval bounds sorted by p_start (int64 ns)
+        p_end_max: Running maximum of p_end (int64 ns)
         
     Returns:
-        Dataframe with one row per zone interval
+        Tuple of (energy index, interval index, overlap ns) arrays
     """
-    logger.info("Exploding wagon data into zone intervals...")
-    rows = []
+    n_e = e_start.shape[0]
+    n_p = p_start.shape[0]
+    
+    # Intervals before lo all end before the hour starts, intervals from
+    # hi on all start after it ends. Both cursors only move forward.
+    lo = np.empty(n_e, dtype=np.int64)
+    hi = np.empty(n_e, dtype=np.int64)
+    a = 0
+    b = 0
+    e_end_max = np.iinfo(np.int64).min
+    for k in range(n_e):
+        while a < n_p and p_end_max[a] <= e_start[k]:
+            a += 1
+        e_end_max = max(e_end_max, e_end[k])
+        while b < n_p and p_start[b] < e_end_max:
+            b += 1
+        lo[k] = a
+        hi[k] = b
+    
+    counts = np.zeros(n_e, dtype=np.int64)
+    for k in prange(n_e):
+        c = 0
+        for j in range(lo[k], hi[k]):
+            if min(e_end[k], p_end[j]) > max(e_start[k], p_start[j]):
+                c += 1
+        counts[k] = c
+    
+    offsets = np.zeros(n_e + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    
+    e_idx = np.empty(offsets[n_e], dtype=np.int64)
+    p_idx = np.empty(offsets[n_e], dtype=np.int64)
+    overlap = np.empty(offsets[n_e], dtype=np.int64)
+    
+    for k in prange(n_e):
+        n = offsets[k]
+        for j in range(lo[k], hi[k]):
+            ov = min(e_end[k], p_end[j]) - max(e_start[k], p_start[j])
+            if ov > 0:
+                e_idx[n] = k
+                p_idx[n] = j
+                overlap[n] = ov
+                n += 1
+    
+    return e_idx, p_idx, overlap
+
+
+def _overlap_pairs_numpy(e_start, e_end, p_start, p_end, p_end_max):
+    """
+    Vectorized NumPy equivalent of _overlap_kernel, used without numba.
+    
+    Same binary-search windows per hour, expanded into flat candidate
+    pairs with np.repeat instead of a Python loop.
+    """
+    lo = np.searchsorted(p_end_max, e_start, side="right")
+    hi = np.searchsorted(p_start, e_end, side="left")
+    counts = np.maximum(hi - lo, 0)
+    
+    # Flat candidate list: hour k contributes intervals lo[k] .. hi[k]-1
+    e_idx = np.repeat(np.arange(len(e_start)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    p_idx = np.repeat(lo, counts) + offsets
     
-    for _, record in df.iterrows():
-        intervals = build_intervals(record)
+    overlap = (np.minimum(e_end[e_idx], p_end[p_idx])
+               - np.maximum(e_start[e_idx], p_start[p_idx]))
+    keep = overlap > 0
+    
+    return e_idx[keep], p_idx[keep], overlap[keep]
+
+
+def _allocate_zone(e_zone: pd.DataFrame, ivals_zone: pd.DataFrame, energy_col: str) -> pd.DataFrame:
+    """
+    Allocate one zone's hourly energy to the intervals spent in that zone.
+    
+    Args:
+        e_zone: Energy records with non-zero consumption in energy_col
+        ivals_zone: Intervals of the matching zone
+        energy_col: Energy column of the zone
         
-        for zone, start_time, end_time in intervals:
-            rows.append({
-                "WG_Nr": record["WG_Nr"],
-                "Produkt": record["Produkt"],
-                "Stärke": record.get("Stärke", np.nan),
-                "m3": record["m3"],
-                "Zone": zone,
-                "P_start": start_time,
-                "P_end": end_time,
-                "Month": record["Month"],
-                "Year": record.get("Year", np.nan)
-            })
-    
-    result = pd.DataFrame(rows)
-    logger.info(f"Created {len(result)} zone intervals")
-    return result
+    Returns:
+        Allocation rows for this zone (may be empty)
+    """
+    # Sort hours and intervals by start time for the overlap kernel
+    e_start = _as_ns(e_zone["E_start"])
+    e_order = np.argsort(e_start, kind="stable")
+    e_start = e_start[e_order]
+    e_end = _as_ns(e_zone["E_end"])[e_order]
+    
+    p_start = _as_ns(ivals_zone["P_start"])
+    order = np.argsort(p_start, kind="stable")
+    p_start = p_start[order]
+    p_end = _as_ns(ivals_zone["P_end"])[order]
+    
+    overlap_pairs = _overlap_kernel if HAS_NUMBA else _overlap_pairs_numpy
+    e_idx, p_idx, overlap_ns = overlap_pairs(
+        e_start, e_end, p_start, p_end, np.maximum.accumulate(p_end)
+    )
+    
+    e_rows = e_order[e_idx]
+    p_rows = order[p_idx]
+    overlap_h = overlap_ns / NS_PER_HOUR
+    
+    return pd.DataFrame({
+        'Month': e_zone['Month'].to_numpy()[e_rows],
+        'Produkt': ivals_zone['Produkt'].array.take(p_rows),
+        'm3': ivals_zone['m3'].to_numpy()[p_rows],
+        'Energy_share_kWh': e_zone[energy_col].to_numpy()[e_rows] * overlap_h,
+        'Overlap_h': overlap_h,
+        'Zone': ivals_zone['Zone'].array.take(p_rows)
+    })
 
 
 def allocate_energy(e: pd.DataFrame, ivals: pd.DataFrame) -> pd.DataFrame:
@@ -316,54 +580,19 @@ def allocate_energy(e: pd.DataFrame, ivals: pd.DataFrame) -> pd.DataFrame:
             continue
         
         # Filter energy records with non-zero values
-        e_zone = e[e[energy_col].notna() & (e[energy_col] > 0)].copy()
+        e_zone = e.loc[e[energy_col].notna() & (e[energy_col] > 0),
+                       ["Month", "E_start", "E_end", energy_col]]
         if e_zone.empty:
             continue
         
         # Filter intervals for this zone
-        ivals_zone = ivals[ivals["Zone"] == zone_label].copy()
+        ivals_zone = ivals[ivals["Zone"] == zone_label]
         if ivals_zone.empty:
             continue
         
-        # Cross join using dummy key (vectorized)
-        e_zone['_key'] = 1
-        ivals_zone['_key'] = 1
-        merged = e_zone.merge(ivals_zone, on='_key', suffixes=('_e', '_p'))
-        merged.drop('_key', axis=1, inplace=True)
-        
-        # Filter for overlapping time ranges
-        merged = merged[
-            (merged['P_end'] > merged['E_start']) & 
-            (merged['P_start'] < merged['E_end'])
-        ]
-        
-        if merged.empty:
-            continue
-        
-        # Calculate overlap hours (vectorized)
-        merged['latest_start'] = merged[['E_start', 'P_start']].max(axis=1)
-        merged['earliest_end'] = merged[['E_end', 'P_end']].min(axis=1)
-        merged['overlap_h'] = (
-            (merged['earliest_end'] - merged['latest_start']).dt.total_seconds() / 3600
-        ).clip(lower=0)
-        
-        # Filter zero overlaps
-        merged = merged[merged['overlap_h'] > 0]
-        
-        if merged.empty:
-            continue
-        
-        # Calculate energy share
-        merged['Energy_share_kWh'] = merged[energy_col] * merged['overlap_h']
-        
-        # Select and rename columns
-        result = merged[[
-            'Month_e', 'Produkt', 'm3', 
-            'Energy_share_kWh', 'overlap_h'
-        ]].rename(columns={'Month_e': 'Month', 'overlap_h': 'Overlap_h'})
-        
-        result['Zone'] = zone_label
-        results.append(result)
+        zone_alloc = _allocate_zone(e_zone, ivals_zone, energy_col)
+        if not zone_alloc.empty:
+            results.append(zone_alloc)
     
     if results:
         final_result = pd.concat(results, ignore_index=True)
@@ -377,29 +606,78 @@ def allocate_energy(e: pd.DataFrame, ivals: pd.DataFrame) -> pd.DataFrame:
         ])
 
 
+def _excel_values(col: pd.Series) -> list:
+    """
+    Convert a column to plain Python values for xlsxwriter's write_row.
+    
+    Mirrors pandas' own Excel conversion: missing values become blank cells,
+    timedeltas become days and unsupported objects are written as text.
+    """
+    if pd.api.types.is_timedelta64_dtype(col):
+        col = col / pd.Timedelta(days=1)
+    elif not pd.api.types.is_datetime64_dtype(col) and col.dtype == object:
+        col = col.map(
+            lambda v: v if isinstance(v, (str, bool, int, float, np.number, datetime.date)) else str(v),
+            na_action="ignore"
+        )
+    values = col.astype(object)
+    return values.where(col.notna(), None).tolist()
+
+
+def _write_rows(wb, sheet_name: str, df: pd.DataFrame, header_format) -> None:
+    """
+    Write a dataframe to a new worksheet row by row.
+    
+    Faster than DataFrame.to_excel for large sheets, which dispatches every
+    cell through pandas' formatter.
+    
+    Args:
+        wb: xlsxwriter Workbook
+        sheet_name: Name of the new worksheet
+        df: Data to write, header in the first row
+        header_format: Format for the header row
+    """
+    ws = wb.add_worksheet(sheet_name)
+    ws.write_row(0, 0, [str(c) for c in df.columns], header_format)
+    
+    columns = [_excel_values(df[c]) for c in df.columns]
+    for row_num, row in enumerate(zip(*columns), start=1):
+        ws.write_row(row_num, 0, row)
+
+
 def main():
     """Main execution function"""
     try:
         logger.info("=== Starting Dryer KPI Analysis ===")
         
-        # Load and parse energy data
+        # Read the workbooks one after the other - threads gained nothing here,
+        # the readers hold the GIL for most of their work
         logger.info(f"Loading energy data from: {CONFIG['energy_file']}")
-        e_raw = pd.read_excel(CONFIG["energy_file"], sheet_name=CONFIG["energy_sheet"])
-        e = parse_energy(e_raw)
+        e_raw = read_excel(
+            CONFIG["energy_file"],
+            sheet_name=CONFIG["energy_sheet"],
+            usecols=column_selector(CONFIG["energy_usecols"])
+        )
         
-        # Load and parse wagon data
         logger.info(f"Loading wagon data from: {CONFIG['wagon_file']}")
-        w_raw = pd.read_excel(
-            CONFIG["wagon_file"], 
-            sheet_name=CONFIG["wagon_sheet"], 
-            header=CONFIG["wagon_header_row"]
+        w_raw = read_excel(
+            CONFIG["wagon_file"],
+            sheet_name=CONFIG["wagon_sheet"],
+            header=CONFIG["wagon_header_row"],
+            usecols=column_selector(CONFIG["wagon_usecols"])
         )
+        
+        # Parse energy and wagon data
+        e = parse_energy(e_raw)
         w = parse_wagon(w_raw)
         
         # Apply filters
         if CONFIG["product_filter"]:
             logger.info(f"Filtering products: {CONFIG['product_filter']}")
-            w = w[w["Produkt"].astype(str).isin(CONFIG["product_filter"])]
+            # Match on the category labels as text, not on every row
+            products = w["Produkt"].cat.categories
+            wanted = products[products.astype(str).isin(CONFIG["product_filter"])]
+            w = w[w["Produkt"].isin(wanted)]
         
         if CONFIG["month_filter"]:
             logger.info(f"Filtering month: {CONFIG['month_filter']}")
@@ -412,39 +690,66 @@ def main():
         
         # Create monthly summary
         logger.info("Creating monthly summary...")
-        summary = alloc.groupby(["Month", "Produkt", "Zone"], as_index=False).agg(
+        summary = alloc.groupby(["Month", "Produkt", "Zone"], as_index=False, observed=True).agg(
             Energy_kWh=("Energy_share_kWh", "sum"),
             Volume_m3=("m3", "sum")
         )
-        summary["kWh_per_m3"] = summary["Energy_kWh"] / summary["Volume_m3"].replace(0, np.nan)
+        summary["kWh_per_m3"] = _kwh_per_m3(summary)
         
         # Create yearly summary
         logger.info("Creating yearly summary...")
-        yearly = summary.groupby(["Produkt", "Zone"], as_index=False).agg(
+        yearly = summary.groupby(["Produkt", "Zone"], as_index=False, observed=True).agg(
             Energy_kWh=("Energy_kWh", "sum"),
             Volume_m3=("Volume_m3", "sum")
         )
-        yearly["kWh_per_m3"] = yearly["Energy_kWh"] / yearly["Volume_m3"].replace(0, np.nan)
+        yearly["kWh_per_m3"] = _kwh_per_m3(yearly)
         
         # Export to Excel
         logger.info(f"Exporting results to: {CONFIG['output_file']}")
-        with pd.ExcelWriter(CONFIG["output_file"], engine="xlsxwriter") as writer:
-            e.to_excel(writer, sheet_name="Energy_Hourly_Parsed", index=False)
-            w.to_excel(writer, sheet_name="Wagons_Parsed", index=False)
-            ivals.to_excel(writer, sheet_name="Intervals_By_Zone", index=False)
-            alloc.to_excel(writer, sheet_name="Energy_Allocated", index=False)
-            summary.to_excel(writer, sheet_name="Summary_By_Month_Zone", index=False)
-            yearly.to_excel(writer, sheet_name="Yearly_Summary", index=False)
-            
+        _write_parquet(ivals, CONFIG["intervals_file"], "intervals")
+        _write_parquet(alloc, CONFIG["allocation_file"], "energy allocation")
+        
+        sheets = [
+            ("Energy_Hourly_Parsed", e),
+            ("Wagons_Parsed", w),
+            ("Summary_By_Month_Zone", summary),
+            ("Yearly_Summary", yearly),
+        ]
+        
+        # Skip URL/formula detection on every string cell. constant_memory is
+        # not used: pandas writes cells column by column, which that mode drops
+        writer_options = {
+            "strings_to_urls": False,
+            "strings_to_formulas": False,
+            "default_date_format": "YYYY-MM-DD HH:MM:SS",
+            "nan_inf_to_errors": True
+        }
+        
+        # Large sheets are streamed with write_row, the rest go through pandas
+        row_sheets = {"Energy_Hourly_Parsed", "Wagons_Parsed"}
+        
+        with pd.ExcelWriter(
+            CONFIG["output_file"],
+            engine="xlsxwriter",
+            engine_kwargs={"options": writer_options}
+        ) as writer:
             # Format Excel
             wb = writer.book
             fmt_head = wb.add_format({'bold': True, 'bg_color': '#C6E0B4', 'border': 1})
             fmt_num = wb.add_format({'num_format': '#,##0.00', 'border': 1})
+            # Same look as the header pandas writes
+            fmt_raw_head = wb.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+            
+            for sheet_name, df in sheets:
+                if sheet_name in row_sheets:
+                    _write_rows(wb, sheet_name, df, fmt_raw_head)
+                else:
+                    df.to_excel(writer, sheet_name=sheet_name, index=False)
             
             for sheet_name in ["Summary_By_Month_Zone", "Yearly_Summary"]:
                 ws = writer.sheets[sheet_name]
                 ws.set_row(0, 18, fmt_head)
-                ws.set_column("A:F", 18, fmt_num)
+                ws.set_column(0, 5, 18, fmt_num)  # A:F
         
         logger.info("=== Analysis Complete ===")
         logger.info(f"Total Energy: {yearly['Energy_kWh'].sum():,.2f} kWh")
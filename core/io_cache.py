@@ -0,0 +1,120 @@
+"""
+Parquet snapshot cache for parsed dryer input files
+Parsing the source Excel workbooks dominates every run, so the parsed frames are
+stored as Parquet keyed on the source file's path, modification time and size.
+"""
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+from .dryer_kpi_monthly_final import parse_energy, parse_wagon, column_selector, read_excel, CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Delete this directory to force a fresh parse of all source files
+CACHE_DIR = Path(os.getenv("DRYER_CACHE_DIR", ".cache"))
+
+# Part of every snapshot key - bump whenever parse_energy/parse_wagon output changes
+CACHE_VERSION = 1
+
+
+def _cache_path(path: str, kind: str, *settings) -> Path:
+    """
+    Build the snapshot path for a source file.
+
+    Args:
+        path: Source Excel file
+        kind: Snapshot type, e.g. "energy" or "wagon"
+        settings: Parse settings that change the snapshot content
+
+    Returns:
+        Path of the Parquet snapshot inside CACHE_DIR
+    """
+    stat = os.stat(path)
+    raw_key = ":".join(str(p) for p in (CACHE_VERSION, path, stat.st_mtime, stat.st_size, *settings))
+    key = hashlib.blake2b(raw_key.encode()).hexdigest()[:16]
+    return CACHE_DIR / f"{key}-{kind}.parquet"
+
+
+def _load_cached(cache_file: Path, kind: str, load: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Return the snapshot if present, otherwise run the loader and store its result.
+
+    Args:
+        cache_file: Snapshot path from _cache_path
+        kind: Snapshot type used in log messages
+        load: Callable that reads and parses the source file
+
+    Returns:
+        Parsed dataframe
+    """
+    if cache_file.exists():
+        logger.info(f"Loading cached {kind} data from: {cache_file}")
+        return pd.read_parquet(cache_file)
+
+    df = load()
+
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(cache_file, compression="zstd")
+        logger.info(f"Cached {kind} data to: {cache_file}")
+    except Exception as e:
+        # Caching is best effort - e.g. mixed-type raw columns Arrow cannot store
+        logger.warning(f"Could not cache {kind} data: {str(e)}")
+        cache_file.unlink(missing_ok=True)
+
+    return df
+
+
+def load_energy_cached(path: str) -> pd.DataFrame:
+    """
+    Load and parse the hourly energy workbook, reusing a Parquet snapshot.
+
+    Args:
+        path: Energy Excel file
+
+    Returns:
+        Parsed energy dataframe (see parse_energy)
+    """
+    cache_file = _cache_path(path, "energy", CONFIG["energy_sheet"], CONFIG["gas_to_kwh"])
+
+    def load():
+        logger.info(f"Loading energy data from: {path}")
+        e_raw = read_excel(
+            path,
+            sheet_name=CONFIG["energy_sheet"],
+            usecols=column_selector(CONFIG["energy_usecols"])
+        )
+        return parse_energy(e_raw)
+
+    return _load_cached(cache_file, "energy", load)
+
+
+def load_wagon_cached(path: str) -> pd.DataFrame:
+    """
+    Load and parse the wagon tracking workbook, reusing a Parquet snapshot.
+
+    Args:
+        path: Wagon tracking Excel file
+
+    Returns:
+        Parsed wagon dataframe (see parse_wagon)
+    """
+    cache_file = _cache_path(path, "wagon", CONFIG["wagon_sheet"], CONFIG["wagon_header_row"])
+
+    def load():
+        logger.info(f"Loading wagon data from: {path}")
+        w_raw = read_excel(
+            path,
+            sheet_name=CONFIG["wagon_sheet"],
+            header=CONFIG["wagon_header_row"],
+            usecols=column_selector(CONFIG["wagon_usecols"])
+        )
+        return parse_wagon(w_raw)
+
+    return _load_cached(cache_file, "wagon", load)
@@ -0,0 +1,166 @@
+"""
+Production sequencing kernels for the optimizers
+Kept in an importable module so the numba dispatchers are set up once per process
+instead of on every Streamlit rerun.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    # numba is optional - without it the NumPy/Python fallbacks are used
+    HAS_NUMBA = False
+    
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# Compiled for explicit signatures at import, machine code cached on disk
+@njit("Tuple((i8[:], f8))(f8[:, :])", cache=True)
+def _held_karp_kernel(costs):
+    """Held-Karp DP for the cheapest open path through all products, as loops for numba"""
+    n = costs.shape[0]
+    full = (1 << n) - 1
+    
+    # dp[mask, j]: cheapest path visiting the products in mask, ending at j
+    dp = np.full((1 << n, n), np.inf)
+    parent = np.full((1 << n, n), -1, dtype=np.int16)
+    for i in range(n):
+        dp[1 << i, i] = 0.0
+    
+    # Supersets are always larger integers, so plain mask order is a valid DP order
+    for mask in range(1, full):
+        for i in range(n):
+            path_cost = dp[mask, i]
+            if path_cost == np.inf:
+                continue
+            for j in range(n):
+                if mask & (1 << j):
+                    continue
+                new_mask = mask | (1 << j)
+                cost = path_cost + costs[i, j]
+                if cost < dp[new_mask, j]:
+                    dp[new_mask, j] = cost
+                    parent[new_mask, j] = i
+    
+    # Walk the parents back from the cheapest final product
+    last = np.argmin(dp[full])
+    best_cost = dp[full, last]
+    order = np.empty(n, dtype=np.int64)
+    mask = full
+    for k in range(n - 1, -1, -1):
+        order[k] = last
+        prev = parent[mask, last]
+        mask ^= 1 << last
+        last = prev
+    return order, best_cost
+
+
+def _held_karp_numpy(costs):
+    """Held-Karp DP without numba, vectorized over the end products of each mask"""
+    n = costs.shape[0]
+    full = (1 << n) - 1
+    
+    dp = np.full((1 << n, n), np.inf)
+    parent = np.full((1 << n, n), -1, dtype=np.int16)
+    dp[1 << np.arange(n), np.arange(n)] = 0
+    
+    for mask in range(1, full):
+        via = dp[mask][:, None] + costs
+        best_prev = via.argmin(axis=0)
+        best_cost = via[best_prev, np.arange(n)]
+        
+        nxt = np.flatnonzero(~(mask >> np.arange(n)) & 1)
+        new_masks = mask | (1 << nxt)
+        better = best_cost[nxt] < dp[new_masks, nxt]
+        dp[new_masks[better], nxt[better]] = best_cost[nxt[better]]
+        parent[new_masks[better], nxt[better]] = best_prev[nxt[better]]
+    
+    last = int(np.argmin(dp[full]))
+    best_cost = dp[full, last]
+    order = [last]
+    mask = full
+    while parent[mask, last] >= 0:
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+        order.append(last)
+    return order[::-1], best_cost
+
+
+@njit("i8[:](i8[:], f8[:, :])", cache=True)
+def two_opt(order, costs):
+    """Reverse segments of an open path while that lowers its cost (costs must be symmetric)"""
+    order = order.copy()
+    n = len(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n - 1):
+            for j in range(i + 1, n):
+                # Only the two edges around the reversed segment change
+                delta = 0.0
+                if i > 0:
+                    delta += costs[order[i - 1], order[j]] - costs[order[i - 1], order[i]]
+                if j < n - 1:
+                    delta += costs[order[i], order[j + 1]] - costs[order[j], order[j + 1]]
+                if delta < -1e-9:
+                    order[i:j + 1] = order[i:j + 1][::-1].copy()
+                    improved = True
+    return order
+
+
+@njit("i8[:](f8[:, :], i8)", cache=True)
+def lookahead_sequence(costs, start):
+    """Greedy path that scores each candidate by its cost plus 0.3x its cheapest next move"""
+    n = costs.shape[0]
+    order = np.empty(n, dtype=np.int64)
+    visited = np.zeros(n, dtype=np.bool_)
+    order[0] = start
+    visited[start] = True
+    
+    for step in range(1, n):
+        current = order[step - 1]
+        best_next = -1
+        best_score = np.inf
+        
+        for j in range(n):
+            if visited[j]:
+                continue
+            
+            # Lookahead - no following move once j is the last product
+            future = np.inf
+            for k in range(n):
+                if not visited[k] and k != j and costs[j, k] < future:
+                    future = costs[j, k]
+            if future == np.inf:
+                future = 0.0
+            
+            score = costs[current, j] + future * 0.3
+            if score < best_score:
+                best_score = score
+                best_next = j
+        
+        order[step] = best_next
+        visited[best_next] = True
+    
+    return order
+
+
+def held_karp(costs: np.ndarray):
+    """
+    Exact cheapest open path through all products (Held-Karp bitmask DP).
+    
+    Args:
+        costs: Square transition cost matrix, costs[i, j] for going from i to j
+        
+    Returns:
+        Tuple of (visiting order as an int64 array of product positions, total cost)
+    """
+    if HAS_NUMBA:
+        order, best_cost = _held_karp_kernel(costs)
+    else:
+        order, best_cost = _held_karp_numpy(costs)
+    return np.asarray(order, dtype=np.int64), best_cost
@@ -5,9 +5,59 @@ import pickle
 import json
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 from datetime import datetime
+from functools import lru_cache
 import os
 
+
+def _file_key(path):
+    """Cache key for a history file, None if nothing was saved yet"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+@lru_cache(maxsize=8)
+def _read_history_file(path, mtime_ns, size, max_entries):
+    """Read a history file once per file version (mtime and size in the cache key)
+    
+    The file is a sequence of Arrow IPC streams, one per save. Only the latest
+    max_entries entries are returned, together with the number of entries on disk.
+    """
+    segments = []
+    with pa.OSFile(path, 'rb') as source:
+        while source.tell() < size:
+            segments.append(pa.ipc.open_stream(source).read_all().to_pandas())
+    history = pd.concat(segments, ignore_index=True)
+    
+    entries = history['timestamp'].drop_duplicates()
+    keep = history['timestamp'].isin(entries.iloc[-max_entries:])
+    return history[keep].reset_index(drop=True), len(entries)
+
+
+@lru_cache(maxsize=4)
+def _consolidate_history(path, mtime_ns, size, max_entries):
+    """Consolidate saved yearly rows per product and zone once per file version"""
+    history, _ = _read_history_file(path, mtime_ns, size, max_entries)
+    
+    # One aggregation pass; observed=True skips unused category combinations
+    consolidated = history.groupby(['Produkt', 'Zone'], observed=True).agg(
+        Energy_kWh=('Energy_kWh', 'sum'),
+        Volume_m3=('Volume_m3', 'sum'),
+        sample_count=('Energy_kWh', 'size')
+    ).reset_index()
+    
+    energy = consolidated['Energy_kWh'].to_numpy(dtype=float)
+    volume = consolidated['Volume_m3'].to_numpy(dtype=float)
+    consolidated.insert(4, 'kWh_per_m3', np.divide(energy, volume, out=np.zeros_like(energy), where=volume > 0))
+    consolidated['confidence'] = np.minimum(consolidated['sample_count'] / 10, 1.0)
+    
+    return consolidated
+
+
 class HistoricalDataManager:
     def __init__(self, storage_path="dryer_historical_data"):
         """Initialize historical data manager"""
@@ -15,72 +65,137 @@ class HistoricalDataManager:
         if not os.path.exists(storage_path):
             os.makedirs(storage_path)
         
-        self.kpi_file = os.path.join(storage_path, "kpi_history.pkl")
-        self.optimization_file = os.path.join(storage_path, "optimization_history.pkl")
+        # History is stored long-form: one row per yearly/summary record,
+        # tagged with the timestamp of the analysis it belongs to. Each save
+        # appends one Arrow IPC stream to the file instead of rewriting it.
+        self.kpi_file = os.path.join(storage_path, "kpi_history.arrows")
+        self.kpi_summary_file = os.path.join(storage_path, "kpi_summary_history.arrows")
+        self.optimization_file = os.path.join(storage_path, "optimization_history.arrows")
         self.consolidated_file = os.path.join(storage_path, "consolidated_yearly.pkl")
+        
+        # Number of saved entries kept per history file
+        self.max_entries = {
+            self.kpi_file: 100,
+            self.kpi_summary_file: 100,
+            self.optimization_file: 50
+        }
+        # Entries currently on disk per history file, known once it was read
+        self.entry_counts = {}
+        
+        self._migrate_pickle_history()
+    
+    def _migrate_pickle_history(self):
+        """Convert history saved by older versions as pickled lists"""
+        legacy_kpi = os.path.join(self.storage_path, "kpi_history.pkl")
+        if os.path.exists(legacy_kpi) and not os.path.exists(self.kpi_file):
+            with open(legacy_kpi, 'rb') as f:
+                rows = [self._kpi_rows(entry, entry['timestamp']) for entry in pickle.load(f)]
+            if rows:
+                self._write_history(self.kpi_file, pd.concat([r[0] for r in rows], ignore_index=True))
+                self._write_history(self.kpi_summary_file, pd.concat([r[1] for r in rows], ignore_index=True))
+        
+        legacy_opt = os.path.join(self.storage_path, "optimization_history.pkl")
+        if os.path.exists(legacy_opt) and not os.path.exists(self.optimization_file):
+            with open(legacy_opt, 'rb') as f:
+                entries = pickle.load(f)
+            if entries:
+                self._write_history(self.optimization_file, pd.DataFrame(entries))
+    
+    def _read_history(self, path):
+        """Read a history table, None if nothing was saved yet
+        
+        The returned frame is shared between calls - do not modify it in place.
+        """
+        key = _file_key(path)
+        if key is None:
+            self.entry_counts[path] = 0
+            return None
+        
+        max_entries = self.max_entries[path]
+        history, entries = _read_history_file(*key, max_entries)
+        
+        # Trimming happens on read - compact the file once it holds twice the limit
+        if entries > 2 * max_entries:
+            self._write_history(path, history)
+            entries = max_entries
+        
+        self.entry_counts[path] = entries
+        return history
+    
+    def _write_history(self, path, df, mode='wb'):
+        """Write a history table as one Arrow IPC stream, appended with mode='ab'"""
+        table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        options = pa.ipc.IpcWriteOptions(compression='lz4')
+        with pa.OSFile(path, mode) as sink, pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    
+    def _append_history(self, path, rows):
+        """Append the rows of one entry without rewriting earlier entries"""
+        if path not in self.entry_counts:
+            self._read_history(path)
+        
+        self._write_history(path, rows, mode='ab')
+        self.entry_counts[path] += 1
+        
+        # Compact from the save path too, a process that never reads would grow the file forever
+        if self.entry_counts[path] > 2 * self.max_entries[path]:
+            self._read_history(path)
+    
+    def _kpi_rows(self, results, timestamp):
+        """Tag yearly and summary rows of one analysis with its timestamp"""
+        yearly = results['yearly'].assign(
+            timestamp=pd.Timestamp(timestamp),
+            total_energy=results['yearly']['Energy_kWh'].sum(),
+            avg_efficiency=results['yearly']['kWh_per_m3'].mean()
+        )
+        summary = results['summary'].assign(timestamp=pd.Timestamp(timestamp))
+        return yearly, summary
     
     def save_kpi_results(self, results, timestamp=None):
         """Save KPI analysis results with timestamp"""
         if timestamp is None:
             timestamp = datetime.now()
         
-        history = self.load_kpi_history()
-        
-        entry = {
-            'timestamp': timestamp,
-            'summary': results['summary'],
-            'yearly': results['yearly'],
-            'products': results['yearly']['Produkt'].unique().tolist(),
-            'total_energy': results['yearly']['Energy_kWh'].sum(),
-            'avg_efficiency': results['yearly']['kWh_per_m3'].mean()
-        }
+        yearly, summary = self._kpi_rows(results, timestamp)
         
-        history.append(entry)
-        
-        if len(history) > 100:
-            history = history[-100:]
-        
-        with open(self.kpi_file, 'wb') as f:
-            pickle.dump(history, f)
+        self._append_history(self.kpi_file, yearly)
+        self._append_history(self.kpi_summary_file, summary)
         
         return True
     
     def load_kpi_history(self):
         """Load KPI history"""
-        try:
-            with open(self.kpi_file, 'rb') as f:
-                return pickle.load(f)
-        except FileNotFoundError:
+        yearly = self._read_history(self.kpi_file)
+        if yearly is None:
             return []
+        
+        summary = self._read_history(self.kpi_summary_file)
+        summaries = {} if summary is None else {
+            ts: rows.drop(columns='timestamp').reset_index(drop=True)
+            for ts, rows in summary.groupby('timestamp', sort=False)
+        }
+        
+        history = []
+        for ts, rows in yearly.groupby('timestamp', sort=False):
+            history.append({
+                'timestamp': ts,
+                'summary': summaries.get(ts, pd.DataFrame()),
+                'yearly': rows.drop(columns=['timestamp', 'total_energy', 'avg_efficiency']).reset_index(drop=True),
+                'products': rows['Produkt'].unique().tolist(),
+                'total_energy': rows['total_energy'].iloc[0],
+                'avg_efficiency': rows['avg_efficiency'].iloc[0]
+            })
+        
+        return history
     
     def get_consolidated_historical_data(self):
         """Get consolidated historical data for ALL products"""
-        history = self.load_kpi_history()
-        
-        if not history:
+        # Reruns reuse the consolidation until the history file changes
+        key = _file_key(self.kpi_file)
+        if key is None or self._read_history(self.kpi_file).empty:
             return None
         
-        all_yearly_data = []
-        for entry in history:
-            yearly_df = entry['yearly'].copy()
-            yearly_df['analysis_date'] = entry['timestamp']
-            all_yearly_data.append(yearly_df)
-        
-        if all_yearly_data:
-            combined = pd.concat(all_yearly_data, ignore_index=True)
-            
-            consolidated = combined.groupby(['Produkt', 'Zone']).apply(
-                lambda x: pd.Series({
-                    'Energy_kWh': x['Energy_kWh'].sum(),
-                    'Volume_m3': x['Volume_m3'].sum(),
-                    'kWh_per_m3': (x['Energy_kWh'].sum() / x['Volume_m3'].sum()) if x['Volume_m3'].sum() > 0 else 0,
-                    'sample_count': len(x),
-                    'confidence': min(len(x) / 10, 1.0)
-                })
-            ).reset_index()
-            
-            return consolidated
-        return None
+        return _consolidate_history(*key, self.max_entries[self.kpi_file]).copy()
     
     def merge_with_current_data(self, current_yearly, weight_historical=0.3):
         """Merge historical data with current analysis"""
@@ -96,14 +211,14 @@ class HistoricalDataManager:
             suffixes=('_current', '_historical')
         )
         
-        merged['kWh_per_m3_combined'] = merged.apply(
-            lambda row: (
-                row['kWh_per_m3_current'] * (1 - weight_historical) +
-                row['kWh_per_m3_historical'] * weight_historical * row.get('confidence', 1.0)
-                if pd.notna(row.get('kWh_per_m3_historical')) 
-                else row['kWh_per_m3_current']
-            ),
-            axis=1
+        # Blend whole columns at once; rows without history keep the current value
+        current = merged['kWh_per_m3_current'].to_numpy(dtype=float)
+        historical = merged['kWh_per_m3_historical'].to_numpy(dtype=float)
+        confidence = merged['confidence'].to_numpy(dtype=float)
+        merged['kWh_per_m3_combined'] = np.where(
+            np.isnan(historical),
+            current,
+            current * (1 - weight_historical) + historical * weight_historical * confidence
         )
         
         merged['kWh_per_m3'] = merged['kWh_per_m3_combined']
@@ -117,32 +232,29 @@ class HistoricalDataManager:
     
     def save_optimization_result(self, products, optimal_order, metrics):
         """Save optimization results"""
-        history = self.load_optimization_history()
-        
-        entry = {
-            'timestamp': datetime.now(),
-            'products': products,
-            'optimal_order': optimal_order,
+        entry = pd.DataFrame([{
+            'timestamp': pd.Timestamp(datetime.now()),
+            'products': list(products),
+            'optimal_order': list(optimal_order),
             'total_cost': metrics['best_cost'],
             'savings_vs_worst': metrics['savings_vs_worst'],
             'savings_vs_avg': metrics['savings_vs_avg']
-        }
-        
-        history.append(entry)
+        }])
         
-        if len(history) > 50:
-            history = history[-50:]
-        
-        with open(self.optimization_file, 'wb') as f:
-            pickle.dump(history, f)
+        self._append_history(self.optimization_file, entry)
     
     def load_optimization_history(self):
         """Load optimization history"""
-        try:
-            with open(self.optimization_file, 'rb') as f:
-                return pickle.load(f)
-        except FileNotFoundError:
+        history = self._read_history(self.optimization_file)
+        if history is None:
             return []
+        
+        # Arrow list columns come back as arrays
+        history = history.assign(**{
+            col: history[col].map(list) for col in ('products', 'optimal_order')
+        })
+        
+        return history.to_dict('records')
     
     def get_product_profile(self, product):
         """Get average historical profile for a product"""
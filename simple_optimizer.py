@@ -4,9 +4,12 @@ Uses the optimization database to instantly find best production sequence
 """
 
 import json
-from itertools import permutations
+import numpy as np
 import pandas as pd
 
+from core.sequencing import held_karp, lookahead_sequence
+
+
 class SimpleProductionOptimizer:
     def __init__(self, database_file="optimization_database.json"):
         """Load the pre-built optimization database"""
@@ -17,6 +20,13 @@ class SimpleProductionOptimizer:
         self.transitions = self.db['transition_matrix']
         self.rules = self.db['optimization_rules']
         
+        # Dense copy of the transition matrix, indexed by product position
+        self.index = {p: i for i, p in enumerate(self.transitions)}
+        self.costs = np.array([
+            [self.transitions[a][b] for b in self.transitions]
+            for a in self.transitions
+        ], dtype=np.float64)
+        
         print(f"✅ Loaded database with {len(self.profiles)} products")
     
     def optimize(self, products, wagons_per_product=None):
@@ -47,9 +57,9 @@ class SimpleProductionOptimizer:
             return {"error": f"Unknown products: {invalid}"}
         
         # Find optimal sequence
-        if len(products) <= 8:
-            # Exhaustive search
-            best_seq, best_cost = self._exhaustive_search(products)
+        if len(products) <= 15:
+            # Exact search
+            best_seq, best_cost = self._held_karp_search(products)
         else:
             # Intelligent heuristic
             best_seq, best_cost = self._intelligent_sequence(products)
@@ -72,51 +82,21 @@ class SimpleProductionOptimizer:
             "estimated_total_energy": self._estimate_total_energy(best_seq, wagons_per_product)
         }
     
-    def _exhaustive_search(self, products):
-        """Try all permutations"""
-        best_seq = None
-        best_cost = float('inf')
-        
-        for perm in permutations(products):
-            cost = self._calculate_sequence_cost(perm)
-            if cost < best_cost:
-                best_cost = cost
-                best_seq = list(perm)
-        
-        return best_seq, best_cost
+    def _held_karp_search(self, products):
+        """Exact shortest open path over all products (Held-Karp bitmask DP)"""
+        idx = np.array([self.index[p] for p in products])
+        order, best_cost = held_karp(self.costs[np.ix_(idx, idx)])
+        return [products[i] for i in order], float(best_cost)
     
     def _intelligent_sequence(self, products):
         """Smart sequencing for larger sets"""
-        # Start with thinnest product
-        remaining = set(products)
-        thickness_map = {p: self.profiles[p]['thickness_mm'] for p in products}
-        
-        current = min(remaining, key=lambda p: thickness_map[p])
-        sequence = [current]
-        remaining.remove(current)
-        
-        # Build sequence greedily with lookahead
-        while remaining:
-            best_next = None
-            best_score = float('inf')
-            
-            for next_prod in remaining:
-                immediate = self.transitions[current][next_prod]
-                
-                # Lookahead
-                future = 0
-                if len(remaining) > 1:
-                    temp_remaining = remaining - {next_prod}
-                    future = min(self.transitions[next_prod][fp] for fp in temp_remaining) * 0.3
-                
-                score = immediate + future
-                if score < best_score:
-                    best_score = score
-                    best_next = next_prod
-            
-            sequence.append(best_next)
-            remaining.remove(best_next)
-            current = best_next
+        idx = np.array([self.index[p] for p in products])
+        thickness = np.array([self.profiles[p]['thickness_mm'] for p in products])
+        
+        # Start with thinnest product, build greedily with lookahead
+        start = int(np.argmin(thickness))
+        order = lookahead_sequence(self.costs[np.ix_(idx, idx)], start)
+        sequence = [products[i] for i in order]
         
         cost = self._calculate_sequence_cost(sequence)
         return sequence, cost
@@ -155,13 +135,10 @@ class SimpleProductionOptimizer:
         """Detailed transition analysis"""
         transitions = []
         
-        for i in range(len(sequence) - 1):
-            from_prod = sequence[i]
-            to_prod = sequence[i+1]
-            
-            from_profile = self.profiles[from_prod]
-            to_profile = self.profiles[to_prod]
-            
+        # Look each profile up once - inner products belong to two pairs
+        steps = [(p, self.profiles[p]) for p in sequence]
+        
+        for (from_prod, from_profile), (to_prod, to_profile) in zip(steps, steps[1:]):
             transitions.append({
                 "from": from_prod,
                 "to": to_prod,
@@ -177,30 +154,31 @@ class SimpleProductionOptimizer:
         """Generate specific recommendations"""
         recommendations = []
         
-        # Check for difficult transitions
-        for i in range(len(sequence) - 1):
-            cost = self.transitions[sequence[i]][sequence[i+1]]
-            
-            if cost > 100:
+        # Flag difficult transitions for the whole sequence at once
+        idx = np.array([self.index[p] for p in sequence])
+        cost = self.costs[idx[:-1], idx[1:]]
+        types = np.array([self.profiles[p]['type'] for p in sequence])
+        type_change = types[:-1] != types[1:]
+        high_cost = cost > 100
+        
+        # Only flagged transitions are formatted
+        for i in np.flatnonzero(high_cost | type_change):
+            from_prod, to_prod = sequence[i], sequence[i + 1]
+            if high_cost[i]:
                 recommendations.append(
-                    f"⚠️ High transition cost from {sequence[i]} to {sequence[i+1]} "
-                    f"({cost:.1f} kWh). Allow extra setup time."
+                    f"⚠️ High transition cost from {from_prod} to {to_prod} "
+                    f"({cost[i]:.1f} kWh). Allow extra setup time."
                 )
             
-            from_profile = self.profiles[sequence[i]]
-            to_profile = self.profiles[sequence[i+1]]
-            
-            if from_profile['type'] != to_profile['type']:
+            if type_change[i]:
                 recommendations.append(
-                    f"🔧 Material type change: {sequence[i]} → {sequence[i+1]}. "
+                    f"🔧 Material type change: {from_prod} → {to_prod}. "
                     f"Schedule cleaning and quality inspection."
                 )
         
         # Energy recommendations
-        energy_intensive = [
-            p for p in sequence 
-            if self.profiles[p]['avg_kwh_per_m3'] > 100
-        ]
+        energy = np.array([self.profiles[p]['avg_kwh_per_m3'] for p in sequence])
+        energy_intensive = [sequence[i] for i in np.flatnonzero(energy > 100)]
         
         if energy_intensive:
             recommendations.append(